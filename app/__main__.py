@@ -0,0 +1,35 @@
+"""
+Launcher: python -m app [--host HOST] [--port PORT] [--workers N] [--reload]
+
+Xóa số liệu Prometheus của lần chạy trước đúng một lần, trước khi uvicorn khởi động các process API
+(và job worker của chúng), rồi chạy app.main:app.
+"""
+
+import argparse
+import os
+import shutil
+
+import uvicorn
+
+from app.config import get_config
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Video Meeting Summarizer API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="API processes (each with JOB_WORKERS job workers)")
+    parser.add_argument("--reload", action="store_true", help="Restart on code changes (development)")
+    args = parser.parse_args()
+
+    config = get_config()
+    # PROMETHEUS_MULTIPROC_DIR đặt từ bên ngoài thì do bên ngoài quản lý; METRICS_DIR thì làm sạch ở đây,
+    # các process API/worker kế thừa biến môi trường
+    if config.METRICS_ENABLED and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        shutil.rmtree(config.METRICS_DIR, ignore_errors=True)
+        config.METRICS_DIR.mkdir(parents=True, exist_ok=True)
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(config.METRICS_DIR)
+
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers, reload=args.reload)
+
+if __name__ == "__main__":
+    main()
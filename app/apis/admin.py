@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from typing import Optional
+import json
+import secrets
+
+from app.config import get_config
+from app.utils.file_response import SummaryFileResponse
+from app.utils.profiling import PROFILE_FILES, profile_dir
+
+# Get configuration
+config = get_config()
+
+def is_admin(authorization: Optional[str]) -> bool:
+    """True khi header Authorization là "Bearer <ADMIN_TOKEN>" (luôn False khi ADMIN_TOKEN chưa đặt)."""
+    if not config.ADMIN_TOKEN:
+        return False
+    scheme, _, token = (authorization or "").partition(" ")
+    return scheme.lower() == "bearer" and secrets.compare_digest(token.encode(), config.ADMIN_TOKEN.encode())
+
+def require_admin(authorization: Optional[str] = Header(None)):
+    """Admin endpoints need "Authorization: Bearer <ADMIN_TOKEN>"; they do not exist when ADMIN_TOKEN is unset."""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin(authorization):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+router = APIRouter(
+    prefix="/api/v1/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin)],
+)
+
+@router.get("/profiles/{task_id}")
+async def get_task_profile(task_id: str):
+    """
+    Summary of the profile captured for a task (profile=true or PROFILE_SAMPLE_RATE) and its files.
+    """
+    summary_path = profile_dir(task_id) / "summary.json"
+    if profile_dir(task_id).parent.resolve() != config.PROFILE_DIR.resolve() or not summary_path.is_file():
+        raise HTTPException(status_code=404, detail=f"No profile for task {task_id}")
+
+    summary = json.loads(summary_path.read_text(encoding="utf-8"))
+    summary["files"] = {
+        name: f"/api/v1/admin/profiles/{task_id}/{name}"
+        for name in PROFILE_FILES if (profile_dir(task_id) / name).is_file()
+    }
+    return summary
+
+@router.get("/profiles/{task_id}/{file_name}")
+async def get_task_profile_file(task_id: str, file_name: str):
+    """
+    Download one profile artifact: profile.prof (load with pstats or snakeviz), profile.txt, memory.txt, summary.json.
+    """
+    full_path = profile_dir(task_id) / file_name
+    if (
+        file_name not in PROFILE_FILES
+        or full_path.parent.parent.resolve() != config.PROFILE_DIR.resolve()
+        or not full_path.is_file()
+    ):
+        raise HTTPException(status_code=404, detail="Profile file not found")
+
+    return SummaryFileResponse(
+        path=full_path,
+        media_type=PROFILE_FILES[file_name],
+        filename=f"{task_id}_{file_name}",
+        headers={"Cache-Control": "private, no-store"},
+    )
@@ -1,71 +1,209 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse
-from typing import Optional, Union, Dict, Any, List
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException, Depends, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional, Union, Dict, Any, List, Tuple
 import traceback
+import json
 import os
 import uuid
 import asyncio
 import shutil
+import threading
 from pathlib import Path
 import time
 
 from app.models.base import TaskResponse, TaskStatus, TaskStatusEnum
+from app.apis.admin import is_admin
 from app.config import get_config
-from app.utils.pipeline import summary_video
+from app.utils.job_queue import get_job_queue
+from app.utils.task_store import FINAL_STATUSES, OWNER_ID, get_task_store
+from app.utils.profiling import should_profile
+from app.utils.edl import EDL_FORMATS
+from app.utils.file_response import SummaryFileResponse
+from app.utils.hls import HLS_MEDIA_TYPES, PLAYLIST_NAME, hls_dir
 
 # Get configuration
 config = get_config()
 
-# Dictionary to store task statuses
-task_status_store = {}
+# Task statuses (TASK_STORE_BACKEND: SQLite shared by all API workers, or in-memory)
+task_store = get_task_store()
+
+class TaskWatchers:
+    """
+    Các stream SSE đang chờ task. Trạng thái task của process này được ghi từ thread đọc tiến độ của
+    job queue hoặc từ event loop; notify() đánh thức stream qua loop.call_soon_threadsafe thay vì để
+    stream poll store.
+    """
+
+    def __init__(self):
+        self._events: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, task_id: str) -> asyncio.Event:
+        event = asyncio.Event()
+        with self._lock:
+            self._events.setdefault(task_id, []).append((asyncio.get_running_loop(), event))
+        return event
+
+    def unsubscribe(self, task_id: str, event: asyncio.Event):
+        with self._lock:
+            watchers = [w for w in self._events.get(task_id, []) if w[1] is not event]
+            if watchers:
+                self._events[task_id] = watchers
+            else:
+                self._events.pop(task_id, None)
+
+    def notify(self, task_id: str):
+        with self._lock:
+            watchers = list(self._events.get(task_id, ()))
+        for loop, event in watchers:
+            loop.call_soon_threadsafe(event.set)
+
+task_watchers = TaskWatchers()
+
+# Overall progress range (start, end) of each pipeline stage
+STAGE_PROGRESS = {
+    "extracting_audio": (0.0, 10.0),
+    "transcribing": (10.0, 50.0),
+    "segmenting": (50.0, 55.0),
+    "scoring": (55.0, 60.0),
+    "generating_summary": (60.0, 100.0),
+}
+
+# Media type of served result files by extension (video/mp4 otherwise)
+RESULT_MEDIA_TYPES = {
+    ".json": "application/json",
+    ".edl": "text/plain; charset=utf-8",
+    ".vtt": "text/vtt; charset=utf-8",
+    ".m4a": "audio/mp4",
+    ".opus": "audio/ogg",
+}
 
 router = APIRouter(
     prefix="/api/v1",
     tags=["Video Meeting Summarizer"],
 )
 
+def video_url(summary_path: Path) -> str:
+    """URL tải video tóm tắt (đường dẫn tương đối so với thư mục gốc project)."""
+    relative_path = summary_path.relative_to(config.BASE_DIR.parent)
+    return f"/api/v1/video/{str(relative_path).replace(os.sep, '/')}"
+
+def parse_target_durations(value: Optional[str]) -> Optional[List[int]]:
+    """Parse danh sách thời lượng dạng "180,300,600" (giây)."""
+    if not value:
+        return None
+    try:
+        durations = [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="target_durations must be a comma-separated list of seconds")
+    if not durations or any(d <= 0 for d in durations):
+        raise HTTPException(status_code=400, detail="target_durations must contain positive durations")
+    if len(durations) > config.MAX_TARGET_DURATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {config.MAX_TARGET_DURATIONS} target durations are allowed")
+    return list(dict.fromkeys(durations))
+
+def parse_edl_formats(value: Optional[str]) -> List[str]:
+    """Parse danh sách định dạng EDL dạng "cmx,vtt" (json luôn được tạo)."""
+    if not value:
+        return []
+    formats = [item.strip().lower() for item in value.split(",") if item.strip()]
+    unsupported = [f for f in formats if f not in EDL_FORMATS]
+    if unsupported:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported edl_formats: {', '.join(unsupported)}. Allowed: {', '.join(EDL_FORMATS)}"
+        )
+    return list(dict.fromkeys(formats))
+
+def make_progress_callback(task_id: str, playlist_path: Optional[Path] = None):
+    """Callback (stage, percent) cập nhật current_step/progress của task (và playlist_url khi HLS sẵn sàng)."""
+    def report(stage: str, percent: float):
+        start, end = STAGE_PROGRESS.get(stage, (0.0, 100.0))
+        # Playlist chỉ được công bố khi đã có ít nhất một fragment
+        playlist_url = None
+        if playlist_path is not None and percent > 0 and playlist_path.exists():
+            playlist_url = f"/api/v1/hls/{playlist_path.parent.name}/{playlist_path.name}"
+        # Tiến độ đến từ thread đọc hàng đợi của worker, có thể trễ hơn kết quả cuối: store bỏ qua khi task đã kết thúc
+        task_store.record_stage(
+            task_id,
+            stage,
+            progress=round(start + (end - start) * percent / 100.0, 1),
+            message=f"{stage.replace('_', ' ').capitalize()}" + (f" ({percent:.0f}%)" if percent > 0 else "..."),
+            playlist_url=playlist_url,
+        )
+        task_watchers.notify(task_id)
+    return report
+
+async def finish_task(task_id: str, status: str, message: str, **fields):
+    """Ghi kết quả task (sqlite chặn: chạy trong threadpool) rồi đánh thức các stream SSE của nó."""
+    await run_in_threadpool(task_store.finish, task_id, status, message, **fields)
+    task_watchers.notify(task_id)
+
+def save_upload(file: UploadFile, video_path: Path):
+    """Ghi file upload ra đĩa (chặn - chạy trong threadpool)."""
+    with open(video_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+
 async def process_video_task(
     task_id: str, 
     video_path: Path, 
-    target_duration: int
+    target_duration: int,
+    model_name: Optional[str] = None,
+    target_durations: Optional[List[int]] = None,
+    render: bool = True,
+    edl_formats: Optional[List[str]] = None,
+    hls: bool = False,
+    audio_only: Optional[bool] = None,
+    profile: bool = False,
 ):
     """Background task to process video summarization"""
     
     try:
-        # Update task status to processing
-        task_status_store[task_id] = {
-            "status": TaskStatusEnum.PROCESSING,
-            "message": "Started processing video",
-            "current_step": "extracting_audio"
-        }
-        
-        # Process the video
-        summary_path = await summary_video(
+        # Process the video in a job worker process; the task stays pending until
+        # the worker picks it up and reports its first stage
+        summary_path = await get_job_queue().run(
+            task_id,
+            on_progress=make_progress_callback(task_id, hls_dir(video_path.stem) / PLAYLIST_NAME if hls else None),
+            profile=profile,
             video_path=video_path,
-            target_duration=target_duration
+            target_duration=target_duration,
+            model_name=model_name,
+            target_durations=target_durations,
+            render=render,
+            edl_formats=edl_formats,
+            hls=hls,
+            audio_only=audio_only,
         )
         
         if not summary_path:
             raise ValueError("Failed to generate summary video")
         
-        # Get relative path for URL
-        relative_path = summary_path.relative_to(config.BASE_DIR.parent)
-        result_url = f"/api/v1/video/{str(relative_path).replace(os.sep, '/')}"
+        if isinstance(summary_path, dict):
+            result_urls = {str(duration): video_url(path) for duration, path in summary_path.items()}
+            await finish_task(
+                task_id,
+                TaskStatusEnum.COMPLETED,
+                "Summary generation completed",
+                result_url=next(iter(result_urls.values())),
+                result_urls=result_urls,
+                result_paths={str(duration): str(path) for duration, path in summary_path.items()},
+            )
+            return
         
         # Update task status to completed
-        task_status_store[task_id] = {
-            "status": TaskStatusEnum.COMPLETED,
-            "message": "Summary generation completed",
-            "result_url": result_url
-        }
+        await finish_task(
+            task_id,
+            TaskStatusEnum.COMPLETED,
+            "Summary generation completed",
+            result_url=video_url(summary_path),
+            result_paths={str(target_duration): str(summary_path)},
+        )
         
     except Exception as e:
         # Update task status to failed
         error_message = f"Error: {str(e)}"
-        task_status_store[task_id] = {
-            "status": TaskStatusEnum.FAILED,
-            "message": error_message
-        }
+        await finish_task(task_id, TaskStatusEnum.FAILED, error_message, error=traceback.format_exc())
         print(f"Task {task_id} failed: {error_message}")
         traceback.print_exc()
 
@@ -74,15 +212,49 @@ async def process_video(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     target_duration: int = Form(300),  # Default 5 minutes (300 seconds)
+    model_name: Optional[str] = Form(None),  # Whisper model, default config.WHISPER_MODEL_NAME
+    target_durations: Optional[str] = Form(None),  # e.g. "180,300,600": one summary per duration, overrides target_duration
+    render: bool = Form(True),  # False: return the selected time ranges (EDL) instead of rendering a video
+    edl_formats: Optional[str] = Form(None),  # With render=false, extra formats besides JSON, e.g. "cmx,vtt"
+    hls: bool = Form(False),  # Publish a growing HLS playlist while the summary renders
+    audio_only: Optional[bool] = Form(None),  # Audio-only summary; default: auto when the upload has no video stream
+    profile: bool = Form(False),  # Capture a cProfile/tracemalloc profile of this task (needs the admin token)
+    authorization: Optional[str] = Header(None),  # "Bearer <ADMIN_TOKEN>" when profile=true
 ):
     """
-    Upload a video file and start the summarization process.
+    Upload a video (or audio) file and start the summarization process.
     Returns a task ID to check the status.
     """
+    if model_name and model_name not in config.WHISPER_ALLOWED_MODELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported model '{model_name}'. Allowed: {', '.join(config.WHISPER_ALLOWED_MODELS)}"
+        )
+    # Profiling làm job chậm và tốn bộ nhớ: chỉ admin được yêu cầu (PROFILE_SAMPLE_RATE vẫn áp dụng cho mọi task)
+    if profile and not is_admin(authorization):
+        raise HTTPException(status_code=403, detail="profile=true requires the admin bearer token")
+    durations = parse_target_durations(target_durations)
+    formats = parse_edl_formats(edl_formats)
+    
+    # Generate a unique task ID
+    task_id = str(uuid.uuid4())
+    
+    # Giữ chỗ trước khi lưu upload: task store đếm task chưa xong của process này trong cùng transaction
+    # tạo task. Giới hạn theo từng process API (--workers N) vì task chỉ chạy trong job queue của process đó
+    if not await run_in_threadpool(task_store.create, task_id, message="Task queued for processing",
+                                   limit=config.JOB_WORKERS + config.JOB_QUEUE_MAX):
+        raise HTTPException(
+            status_code=503,
+            detail="Too many videos are being processed, please retry later",
+            headers={"Retry-After": "60"},
+        )
+    job_queue = get_job_queue()
+    job_queue.reserve()
+    
+    # Chỗ đã giữ được trả lại (task FAILED) trừ khi đã giao cho background task (JobQueue.run trả chỗ khi
+    # job xong); finally thay vì except Exception để cả CancelledError (client ngắt kết nối khi đang upload)
+    handed_off = False
     try:
-        # Generate a unique task ID
-        task_id = str(uuid.uuid4())
-        
         # Create a temporary directory for this task if needed
         temp_video_dir = config.video_upload_path
         os.makedirs(temp_video_dir, exist_ok=True)
@@ -94,22 +266,23 @@ async def process_video(
         video_path = temp_video_dir / video_filename
         
         # Save the uploaded file
-        with open(video_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        # Set initial task status
-        task_status_store[task_id] = {
-            "status": TaskStatusEnum.PENDING,
-            "message": "Task queued for processing"
-        }
+        await run_in_threadpool(save_upload, file, video_path)
         
         # Start the background task
         background_tasks.add_task(
             process_video_task,
             task_id=task_id,
             video_path=video_path,
-            target_duration=target_duration
+            target_duration=target_duration,
+            model_name=model_name,
+            target_durations=durations,
+            render=render,
+            edl_formats=formats,
+            hls=hls,
+            audio_only=audio_only,
+            profile=should_profile(profile),
         )
+        handed_off = True
         
         return TaskResponse(
             task_id=task_id,
@@ -119,22 +292,87 @@ async def process_video(
     except Exception as e:
         error_message = f"Error processing upload: {str(e)}"
         raise HTTPException(status_code=500, detail=error_message)
+    finally:
+        if not handed_off:
+            job_queue.release()
+            # shield: vẫn ghi FAILED khi request đang bị hủy
+            await asyncio.shield(finish_task(task_id, TaskStatusEnum.FAILED, "Upload failed"))
+
+def task_status_response(task_id: str, task_info: Dict[str, Any]) -> TaskStatus:
+    return TaskStatus(
+        task_id=task_id,
+        status=task_info.get("status", TaskStatusEnum.PENDING),
+        message=task_info.get("message", ""),
+        result_url=task_info.get("result_url", None),
+        result_urls=task_info.get("result_urls", None),
+        playlist_url=task_info.get("playlist_url", None),
+        current_step=task_info.get("current_step", None),
+        progress=task_info.get("progress", None),
+        stage_timings=task_info.get("stage_timings", None),
+    )
 
 @router.get("/task-status/{task_id}")
 async def get_task_status(task_id: str):
     """
     Check the status of a video processing task.
     """
-    if task_id not in task_status_store:
+    task_info = await run_in_threadpool(task_store.get, task_id)
+    if task_info is None:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
     
-    task_info = task_status_store[task_id]
+    return task_status_response(task_id, task_info)
+
+async def task_event_stream(task_id: str):
+    """
+    Sinh các sự kiện SSE: gửi trạng thái mỗi khi nó thay đổi, comment keep-alive khi không có gì mới,
+    và đóng stream sau trạng thái COMPLETED/FAILED. Task của process này đánh thức stream khi có
+    trạng thái mới (TaskWatchers); task của API worker khác thì store được đọc lại mỗi TASK_EVENTS_INTERVAL.
+    """
+    yield f"retry: {int(config.TASK_EVENTS_RETRY_SECONDS * 1000)}\n\n"
+    last_payload = None
+    last_sent = time.monotonic()
+    changed = task_watchers.subscribe(task_id)
+    try:
+        while True:
+            # clear trước khi đọc: notify xảy ra trong lúc đọc vẫn đánh thức lần chờ tiếp theo
+            changed.clear()
+            task_info = await run_in_threadpool(task_store.get, task_id)
+            if task_info is None:
+                yield f"event: error\ndata: {json.dumps({'detail': f'Task {task_id} not found'})}\n\n"
+                return
+            payload = task_status_response(task_id, task_info).model_dump_json()
+            if payload != last_payload:
+                yield f"event: status\ndata: {payload}\n\n"
+                last_payload = payload
+                last_sent = time.monotonic()
+                if task_info["status"] in FINAL_STATUSES:
+                    return
+            elif time.monotonic() - last_sent >= config.TASK_EVENTS_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            
+            keepalive_in = config.TASK_EVENTS_KEEPALIVE_SECONDS - (time.monotonic() - last_sent)
+            if task_info.get("owner") != OWNER_ID:
+                keepalive_in = min(keepalive_in, config.TASK_EVENTS_INTERVAL)
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=max(keepalive_in, 0))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        task_watchers.unsubscribe(task_id, changed)
+
+@router.get("/task-events/{task_id}")
+async def get_task_events(task_id: str):
+    """
+    Stream status changes of a task as Server-Sent Events (event "status", same JSON as /task-status).
+    """
+    if await run_in_threadpool(task_store.get, task_id) is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
     
-    return TaskStatus(
-        task_id=task_id,
-        status=task_info.get("status", TaskStatusEnum.PENDING),
-        message=task_info.get("message", ""),
-        result_url=task_info.get("result_url", None)
+    return StreamingResponse(
+        task_event_stream(task_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 @router.get("/video/{path:path}")
@@ -142,13 +380,42 @@ async def get_video_file(path: str):
     """
     Serve the generated video files.
     """
-    full_path = config.BASE_DIR.parent / path
+    full_path = (config.BASE_DIR.parent / path).resolve()
     
-    if not os.path.isfile(full_path):
+    # Chỉ phục vụ file kết quả trong thư mục summaries
+    if not full_path.is_relative_to(config.SUMMARY_DIR.resolve()) or not os.path.isfile(full_path):
         raise HTTPException(status_code=404, detail="Video file not found")
     
-    return FileResponse(
+    # Range/206, ETag/Last-Modified, 304 và pathsend (zero-copy) khi server hỗ trợ (uvicorn thì không)
+    return SummaryFileResponse(
         path=full_path,
-        media_type="video/mp4",
-        filename=os.path.basename(path)
+        media_type=RESULT_MEDIA_TYPES.get(full_path.suffix.lower(), "video/mp4"),
+        filename=full_path.name,
+        content_disposition_type="inline",
+        headers={"Cache-Control": "public, max-age=3600"},
     )
+
+@router.get("/hls/{name}/{file_name}")
+async def get_hls_file(name: str, file_name: str):
+    """
+    Serve the progressive HLS playlist and its fragments while the summary is rendering.
+    """
+    directory = hls_dir(name).resolve()
+    full_path = (directory / file_name).resolve()
+    if full_path.parent != directory or full_path.suffix not in HLS_MEDIA_TYPES or not full_path.is_file():
+        raise HTTPException(status_code=404, detail="HLS file not found")
+    
+    if full_path.name == PLAYLIST_NAME:
+        # Playlist EVENT thay đổi trong lúc render: không cho cache
+        return SummaryFileResponse(
+            path=full_path,
+            media_type="application/vnd.apple.mpegurl",
+            headers={"Cache-Control": "no-cache"},
+        )
+    # Init segment và fragment đã công bố thì không đổi nữa
+    return SummaryFileResponse(
+        path=full_path,
+        media_type=HLS_MEDIA_TYPES[full_path.suffix],
+        headers={"Cache-Control": "public, max-age=86400, immutable"},
+    )
+
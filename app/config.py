@@ -14,7 +14,8 @@ class Config:
     PATHS = {
         "video": BASE_DIR / "video",
         "audio": BASE_DIR / "audio", 
-        "transcript": BASE_DIR / "transcript"
+        "transcript": BASE_DIR / "transcript",
+        "cache": BASE_DIR / "cache",
     }
     
     def __init__(self, base_dir: Path = None):
@@ -33,14 +34,56 @@ class Config:
         self.SCORING_B = 0.75
         self.DOMINANT_PAIR_COUNT = 30
         self.DOMINANT_PAIR_BOOST = 1.2  
+        # "matrix": vectorized search over all pairs, "heap": bounded-memory search over co-occurring pairs only
+        self.DOMINANT_PAIR_SEARCH = os.getenv("DOMINANT_PAIR_SEARCH", "matrix").lower()
+        self.DOMINANT_PAIR_MIN_DF = int(os.getenv("DOMINANT_PAIR_MIN_DF", "1"))  # used by the heap search
         
         self.TEMP_DIR = self.BASE_DIR / "temp_skims"
         self.TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        # Phục vụ qua /api/v1/video: uvicorn không hỗ trợ http.response.pathsend nên file đi qua Python
+        # theo khối 1 MiB; tải nhiều thì để reverse proxy (nginx sendfile) phục vụ thư mục này (xem README)
         self.SUMMARY_DIR = self.BASE_DIR / "summaries"
         self.SUMMARY_DIR.mkdir(parents=True, exist_ok=True)
+        # "ffmpeg": single trim/concat pass, encodes once; "moviepy": cut each segment then concatenate;
+        # "fast": snap cuts to keyframes and stream-copy (no re-encoding, cuts are not frame-exact)
+        self.SKIM_RENDERER = os.getenv("SKIM_RENDERER", "ffmpeg").lower()
+        # "fast" renderer: max distance (seconds) a cut may move to reach a keyframe
+        self.SKIM_KEYFRAME_TOLERANCE = float(os.getenv("SKIM_KEYFRAME_TOLERANCE", "2.0"))
+        # "moviepy" renderer: segments cut in parallel processes (0 = cpu_count // 4, each cut runs ffmpeg with 4 threads)
+        self.SKIM_CUT_WORKERS = int(os.getenv("SKIM_CUT_WORKERS", "0"))
+        # Selected segments separated by less than this gap (seconds) are rendered as one cut
+        self.SKIM_MERGE_GAP = float(os.getenv("SKIM_MERGE_GAP", "1.0"))
+        # Max number of summaries (target_durations) a single request may ask for
+        self.MAX_TARGET_DURATIONS = int(os.getenv("MAX_TARGET_DURATIONS", "5"))
+        # Frame rate used for CMX 3600 timecodes in edit decision list output (render=false)
+        self.EDL_FRAME_RATE = int(os.getenv("EDL_FRAME_RATE", "25"))
+        # Per-process ffmpeg timeout in seconds (0 = no limit); the process is killed when exceeded
+        self.FFMPEG_TIMEOUT = float(os.getenv("FFMPEG_TIMEOUT", "3600"))
+        # Progressive HLS output: fragment length in seconds (keyframe interval of the HLS render)
+        self.HLS_FRAGMENT_SECONDS = float(os.getenv("HLS_FRAGMENT_SECONDS", "6"))
+        # HLS output directories older than this are removed when a new HLS render starts (0 = keep)
+        self.HLS_RETENTION_SECONDS = float(os.getenv("HLS_RETENTION_SECONDS", "3600"))
+        # Audio-only summaries (audio uploads or audio_only=true): "m4a" (AAC) or "opus"
+        self.AUDIO_SUMMARY_FORMAT = os.getenv("AUDIO_SUMMARY_FORMAT", "m4a").lower()
+        if self.AUDIO_SUMMARY_FORMAT not in ("m4a", "opus"):
+            logger.warning(f"Unsupported AUDIO_SUMMARY_FORMAT '{self.AUDIO_SUMMARY_FORMAT}', using m4a.")
+            self.AUDIO_SUMMARY_FORMAT = "m4a"
+        
+        # Artifact cache (audio, transcripts, scored segments) keyed by video content
+        self.CACHE_ENABLED = os.getenv("CACHE_ENABLED", "True").lower() == "true"
+        self.CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(5 * 1024 ** 3)))  # LRU eviction above this size
         
         # Whisper configuration
-        self.WHISPER_MODEL_NAME = "tiny"  # Default model name for Whisper
+        self.WHISPER_MODEL_NAME = os.getenv("WHISPER_MODEL_NAME", "tiny")  # Default model name for Whisper
+        # Models a request may ask for; loaded lazily and kept in an LRU cache within the memory budget
+        self.WHISPER_ALLOWED_MODELS = [m.strip() for m in os.getenv("WHISPER_ALLOWED_MODELS", "tiny,base,small").split(",") if m.strip()]
+        self.WHISPER_MEMORY_BUDGET_MB = int(os.getenv("WHISPER_MEMORY_BUDGET_MB", "4096"))
+        self.WHISPER_WARMUP_MODELS = [m.strip() for m in os.getenv("WHISPER_WARMUP_MODELS", "").split(",") if m.strip()]
+        # Chunked transcription in a pool of Whisper processes (local Whisper only)
+        self.WHISPER_PARALLEL = os.getenv("WHISPER_PARALLEL", "False").lower() == "true"
+        self.WHISPER_CHUNK_MINUTES = float(os.getenv("WHISPER_CHUNK_MINUTES", "5"))
+        self.WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", "0"))  # 0 = cpu_count // WHISPER_THREADS_PER_WORKER
+        self.WHISPER_THREADS_PER_WORKER = int(os.getenv("WHISPER_THREADS_PER_WORKER", "4"))
         
         # Azure Speech Service configuration
         self.AZURE_SPEECH_KEY = os.getenv("AZURE_SPEECH_KEY", "")
@@ -48,6 +91,36 @@ class Config:
         self.AZURE_SPEECH_ENDPOINT = os.getenv("AZURE_SPEECH_ENDPOINT", "https://eastus.api.cognitive.microsoft.com/")
         self.USE_AZURE_SPEECH = os.getenv("USE_AZURE_SPEECH", "False").lower() == "true"
         self.WHISPER_LOCAL = os.getenv("WHISPER_LOCAL", "False").lower() == "true"
+        
+        # Job queue: summaries run in a pool of worker processes, outside the API process
+        self.JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))  # jobs processed concurrently per API process
+        # Unfinished tasks beyond JOB_WORKERS, per API process (each runs only its own tasks); more uploads get 503
+        self.JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "8"))
+        # Task statuses: "sqlite" (persistent, shared by uvicorn --workers N) or "memory" (single process)
+        self.TASK_STORE_BACKEND = os.getenv("TASK_STORE_BACKEND", "sqlite").lower()
+        self.TASK_STORE_PATH = Path(os.getenv("TASK_STORE_PATH", str(self.BASE_DIR / "tasks.db")))
+        # Each API process refreshes a heartbeat on its unfinished tasks; tasks whose heartbeat is older
+        # than TASK_STALE_SECONDS belong to a stopped process and are marked failed ("interrupted")
+        self.TASK_HEARTBEAT_SECONDS = float(os.getenv("TASK_HEARTBEAT_SECONDS", "30"))
+        self.TASK_STALE_SECONDS = float(os.getenv("TASK_STALE_SECONDS", "120"))
+        # Server-Sent Events (/task-events): streams of tasks run by this API process are woken on each update;
+        # tasks of other API processes are re-read from the store every TASK_EVENTS_INTERVAL seconds
+        self.TASK_EVENTS_INTERVAL = float(os.getenv("TASK_EVENTS_INTERVAL", "0.5"))
+        self.TASK_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("TASK_EVENTS_KEEPALIVE_SECONDS", "15"))
+        self.TASK_EVENTS_RETRY_SECONDS = float(os.getenv("TASK_EVENTS_RETRY_SECONDS", "2"))
+        
+        # Prometheus metrics on /metrics (needs prometheus_client); job workers write to METRICS_DIR
+        # unless PROMETHEUS_MULTIPROC_DIR is set
+        self.METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+        self.METRICS_DIR = Path(os.getenv("METRICS_DIR", str(self.BASE_DIR / "metrics")))
+        
+        # Per-task profiling (cProfile + tracemalloc): fraction of tasks profiled without the profile flag
+        self.PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        self.PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(self.BASE_DIR / "profiles")))
+        # Only the newest PROFILE_MAX_KEPT profiles are kept (0 = keep all)
+        self.PROFILE_MAX_KEPT = int(os.getenv("PROFILE_MAX_KEPT", "50"))
+        # Bearer token for /api/v1/admin endpoints (empty = admin endpoints disabled)
+        self.ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
     
     def create_directories(self):
         try:
@@ -69,6 +142,10 @@ class Config:
     @property
     def transcript_path(self) -> Path:
         return self.PATHS["transcript"]
+    
+    @property
+    def cache_path(self) -> Path:
+        return self.PATHS["cache"]
 
 # Get the project root directory (parent of the app directory)
 project_root = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
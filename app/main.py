@@ -2,25 +2,51 @@
 Application entry point for FastAPI.
 """
 
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from fastapi.templating import Jinja2Templates
 import os
 from pathlib import Path
 
 # Import API routers
 from app.apis.summarier import router as summarize_router
+from app.apis.admin import router as admin_router
+from app.config import get_config
+from app.utils.job_queue import get_job_queue
+from app.utils.metrics import METRICS_ACTIVE, mark_process_dead, render_metrics
+from app.utils.task_store import get_task_store
+
+logger = logging.getLogger(__name__)
+
+config = get_config()
 
 # Base directory for the application
 BASE_DIR = Path(__file__).resolve().parent
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pipeline runs in worker processes; each worker warms up WHISPER_WARMUP_MODELS when it starts
+    job_queue = get_job_queue()
+    job_queue.start()
+    # Task chưa xong của process đã dừng (restart, crash) được đánh FAILED thay vì treo mãi ở PROCESSING
+    task_store = get_task_store()
+    task_store.start_heartbeat()
+    yield
+    job_queue.shutdown()
+    task_store.stop_heartbeat()
+    mark_process_dead()
+
 # Create FastAPI app
 app = FastAPI(
     title="Video Meeting Summarizer",
     description="API for summarizing Video Meeting calls",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware
@@ -44,8 +70,17 @@ templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 
 # Include API routers
 app.include_router(summarize_router)
+app.include_router(admin_router)
 
 # Root endpoint - serve the HTML file
 @app.get("/")
 async def read_index():
-    return FileResponse(str(BASE_DIR / "templates" / "index.html"))
\ No newline at end of file
+    return FileResponse(str(BASE_DIR / "templates" / "index.html"))
+
+# Prometheus metrics of the API process and all job workers
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    if not METRICS_ACTIVE:
+        return Response("Metrics are disabled or prometheus_client is not installed\n", status_code=404, media_type="text/plain")
+    content, content_type = render_metrics()
+    return Response(content, media_type=content_type)
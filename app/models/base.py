@@ -1,6 +1,6 @@
 # app/models/summarization.py
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 class TaskResponse(BaseModel):
     task_id: str
@@ -17,6 +17,13 @@ class TaskStatus(BaseModel):
     status: str
     message: Optional[str] = None
     result_url: Optional[str] = None
+    # Khi render: target duration (giây) -> URL video. Khi render=false: định dạng EDL ("json", "cmx", "vtt")
+    # -> URL, với nhiều thời lượng thì khóa là "<duration>.<format>" (vd "180.json")
+    result_urls: Optional[Dict[str, str]] = None
+    playlist_url: Optional[str] = None  # Playlist HLS (hls=true), có ngay khi fragment đầu tiên render xong
+    current_step: Optional[str] = None  # extracting_audio, transcribing, segmenting, scoring, generating_summary
+    progress: Optional[float] = None    # Tiến độ tổng (0-100)
+    stage_timings: Optional[Dict[str, float]] = None  # Thời gian (giây) đã chạy của từng bước
 
 # >> Model quan trọng cho việc này <<
 class TimedWord(BaseModel):
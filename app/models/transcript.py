@@ -0,0 +1,99 @@
+# app/models/transcript.py
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.models.base import Segment, TimedWord
+
+class Transcript:
+    """Transcript dạng cột: danh sách token và hai mảng thời gian start/end (giây)."""
+    __slots__ = ("tokens", "starts", "ends")
+
+    def __init__(self, tokens: Sequence[str], starts: Sequence[float], ends: Sequence[float]):
+        if not (len(tokens) == len(starts) == len(ends)):
+            raise ValueError("tokens, starts and ends must have the same length")
+        self.tokens: List[str] = list(tokens)
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+
+    @classmethod
+    def empty(cls) -> "Transcript":
+        return cls([], [], [])
+
+    @classmethod
+    def from_words(cls, words: Iterable[Tuple[str, float, float]]) -> "Transcript":
+        """Tạo từ các bộ (word, start, end)."""
+        tokens, starts, ends = [], [], []
+        for word, start, end in words:
+            tokens.append(word)
+            starts.append(start)
+            ends.append(end)
+        return cls(tokens, starts, ends)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "Transcript":
+        """Tạo từ list dict {"word", "start", "end"} (ví dụ JSON của Whisper API)."""
+        return cls.from_words((r["word"], float(r["start"]), float(r["end"])) for r in records)
+
+    @classmethod
+    def from_timed_words(cls, words: Iterable[TimedWord]) -> "Transcript":
+        return cls.from_words((w.word, w.start, w.end) for w in words)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def to_records(self, start_idx: int = 0, end_idx: Optional[int] = None) -> List[Dict[str, Any]]:
+        end_idx = len(self) if end_idx is None else end_idx
+        return [
+            {"word": w, "start": s, "end": e}
+            for w, s, e in zip(
+                self.tokens[start_idx:end_idx],
+                self.starts[start_idx:end_idx].tolist(),
+                self.ends[start_idx:end_idx].tolist(),
+            )
+        ]
+
+    def to_timed_words(self, start_idx: int = 0, end_idx: Optional[int] = None) -> List[TimedWord]:
+        return [TimedWord(**r) for r in self.to_records(start_idx, end_idx)]
+
+class SegmentView:
+    """Phân đoạn [start_idx, end_idx) tham chiếu vào Transcript, không sao chép từ/văn bản."""
+    __slots__ = ("id", "transcript", "start_idx", "end_idx", "start_time", "end_time", "duration", "score")
+
+    def __init__(self, id: int, transcript: Transcript, start_idx: int, end_idx: int, score: float = 0.0):
+        self.id = id
+        self.transcript = transcript
+        self.start_idx = start_idx
+        self.end_idx = end_idx
+        self.start_time = float(transcript.starts[start_idx])
+        self.end_time = float(transcript.ends[end_idx - 1])
+        self.duration = max(0.0, self.end_time - self.start_time)
+        self.score = score
+
+    @property
+    def tokens(self) -> List[str]:
+        return self.transcript.tokens[self.start_idx:self.end_idx]
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.tokens)
+
+    @property
+    def words(self) -> List[TimedWord]:
+        return self.transcript.to_timed_words(self.start_idx, self.end_idx)
+
+    def to_model(self) -> Segment:
+        """Chuyển sang model pydantic Segment (chỉ dùng ở biên API)."""
+        return Segment(
+            id=self.id,
+            text=self.text,
+            start_time=self.start_time,
+            end_time=self.end_time,
+            duration=self.duration,
+            score=self.score,
+            words=self.words,
+        )
+
+    def __repr__(self) -> str:
+        return (f"SegmentView(id={self.id}, words=[{self.start_idx}:{self.end_idx}], "
+                f"{self.start_time:.2f}s-{self.end_time:.2f}s, score={self.score:.4f})")
@@ -21,6 +21,7 @@ document.addEventListener('DOMContentLoaded', function () {
     let selectedFile = null;
     let taskId = null;
     let checkStatusInterval = null;
+    let eventSource = null;
 
     // Event Listeners
     dropZone.addEventListener('dragover', handleDragOver);
@@ -61,13 +62,13 @@ document.addEventListener('DOMContentLoaded', function () {
 
     function handleFiles(files) {
         const file = files[0];
-        if (file && file.type.startsWith('video/')) {
+        if (file && (file.type.startsWith('video/') || file.type.startsWith('audio/'))) {
             selectedFile = file;
             fileName.textContent = file.name;
             fileInfo.classList.remove('d-none');
             processBtn.disabled = false;
         } else {
-            alert('Please select a valid video file.');
+            alert('Please select a valid video or audio file.');
         }
     }
 
@@ -122,12 +123,50 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 
-    // Poll for progress
+    // Progress is pushed by the server (SSE); polling is the fallback
     function startProgressCheck() {
+        stopProgressCheck();
+
+        if (window.EventSource) {
+            startEventStream();
+        } else {
+            startPolling();
+        }
+    }
+
+    function stopProgressCheck() {
         if (checkStatusInterval) {
             clearInterval(checkStatusInterval);
+            checkStatusInterval = null;
+        }
+        if (eventSource) {
+            eventSource.close();
+            eventSource = null;
         }
+    }
+
+    function startEventStream() {
+        eventSource = new EventSource(`/api/v1/task-events/${taskId}`);
+
+        eventSource.addEventListener('status', (e) => {
+            try {
+                handleStatus(JSON.parse(e.data));
+            } catch (error) {
+                handleError(error);
+            }
+        });
+
+        eventSource.onerror = () => {
+            // The browser reconnects by itself after network errors; a CLOSED stream
+            // (e.g. blocked or buffered by a proxy) means we fall back to polling
+            if (eventSource && eventSource.readyState === EventSource.CLOSED) {
+                eventSource = null;
+                startPolling();
+            }
+        };
+    }
 
+    function startPolling() {
         checkStatusInterval = setInterval(checkTaskStatus, 2000); // Check every 2 seconds
     }
 
@@ -141,28 +180,30 @@ document.addEventListener('DOMContentLoaded', function () {
                 throw new Error(`Server responded with ${response.status}`);
             }
 
-            const data = await response.json();
-
-            switch (data.status) {
-                case 'PENDING':
-                    updateProgress(10, 'Task pending in queue...');
-                    break;
-                case 'PROCESSING':
-                    handleProcessingSteps(data);
-                    break;
-                case 'COMPLETED':
-                    completeTask(data);
-                    break;
-                case 'FAILED':
-                    throw new Error(data.message || 'Task failed');
-                default:
-                    updateProgress(0, 'Unknown status');
-            }
+            handleStatus(await response.json());
         } catch (error) {
             handleError(error);
         }
     }
 
+    function handleStatus(data) {
+        switch (data.status) {
+            case 'PENDING':
+                updateProgress(10, 'Task pending in queue...');
+                break;
+            case 'PROCESSING':
+                handleProcessingSteps(data);
+                break;
+            case 'COMPLETED':
+                completeTask(data);
+                break;
+            case 'FAILED':
+                throw new Error(data.message || 'Task failed');
+            default:
+                updateProgress(0, 'Unknown status');
+        }
+    }
+
     function handleProcessingSteps(data) {
         // Map processing steps to progress percentage
         const stepToProgress = {
@@ -174,14 +215,15 @@ document.addEventListener('DOMContentLoaded', function () {
         };
 
         const step = data.current_step || 'processing';
-        const progress = stepToProgress[step] || 30;
+        // Prefer the server-reported progress (real encode progress while rendering)
+        const progress = typeof data.progress === 'number' ? data.progress : (stepToProgress[step] || 30);
         const message = data.message || `Processing: ${step.replace('_', ' ')}...`;
 
         updateProgress(progress, message);
     }
 
     function completeTask(data) {
-        clearInterval(checkStatusInterval);
+        stopProgressCheck();
         updateProgress(100, 'Processing complete!');
 
         setTimeout(() => {
@@ -205,7 +247,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
     function handleError(error) {
         console.error('Error:', error);
-        clearInterval(checkStatusInterval);
+        stopProgressCheck();
         updateProgress(0, `Error: ${error.message}`);
 
         setTimeout(() => {
@@ -221,8 +263,6 @@ document.addEventListener('DOMContentLoaded', function () {
         resultContainer.classList.add('d-none');
         updateProgress(0, 'Initializing...');
 
-        if (checkStatusInterval) {
-            clearInterval(checkStatusInterval);
-        }
+        stopProgressCheck();
     }
 });
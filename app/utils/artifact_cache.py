@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+from app.config import get_config
+from app.models.transcript import Transcript
+
+logger = logging.getLogger(__name__)
+
+config = get_config()
+
+class ArtifactCache:
+    """
+    Content-addressed on-disk cache of pipeline artifacts.
+
+    Each key is a directory under root holding named files (audio, transcript,
+    segments/scores). An entry's mtime is refreshed on every hit, and the least
+    recently used entries are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def hash_file(path: Path, chunk_size: int = 1 << 20) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Stable key from JSON-serializable parts (e.g. video hash, backend, config)."""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key
+
+    def _touch(self, key: str):
+        try:
+            os.utime(self._entry_dir(key), None)
+        except OSError:
+            pass
+
+    def _staging_path(self, key: str, name: str) -> Path:
+        entry = self._entry_dir(key)
+        entry.mkdir(parents=True, exist_ok=True)
+        return entry / f".{name}.{os.getpid()}.tmp"
+
+    def _commit(self, key: str, name: str, staging: Path) -> Path:
+        target = self._entry_dir(key) / name
+        os.replace(staging, target)
+        self._touch(key)
+        self.evict(keep=key)
+        return target
+
+    def get_path(self, key: str, name: str) -> Optional[Path]:
+        path = self._entry_dir(key) / name
+        if not path.is_file():
+            return None
+        self._touch(key)
+        return path
+
+    def put_file(self, key: str, name: str, source: Path, move: bool = False) -> Path:
+        staging = self._staging_path(key, name)
+        if move:
+            shutil.move(str(source), staging)
+        else:
+            shutil.copyfile(source, staging)
+        return self._commit(key, name, staging)
+
+    def load_json(self, key: str, name: str) -> Optional[Any]:
+        path = self.get_path(key, name)
+        if path is None:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+    def save_json(self, key: str, name: str, data: Any) -> Path:
+        staging = self._staging_path(key, name)
+        with open(staging, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        return self._commit(key, name, staging)
+
+    def load_array(self, key: str, name: str) -> Optional[np.ndarray]:
+        path = self.get_path(key, name)
+        if path is None:
+            return None
+        try:
+            return np.load(path, allow_pickle=False)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+    def save_array(self, key: str, name: str, array: np.ndarray) -> Path:
+        staging = self._staging_path(key, name)
+        with open(staging, "wb") as f:
+            np.save(f, array, allow_pickle=False)
+        return self._commit(key, name, staging)
+
+    def load_transcript(self, key: str, name: str = "transcript.npz") -> Optional[Transcript]:
+        path = self.get_path(key, name)
+        if path is None:
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return Transcript(data["tokens"].tolist(), data["starts"], data["ends"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+    def save_transcript(self, key: str, transcript: Transcript, name: str = "transcript.npz") -> Path:
+        staging = self._staging_path(key, name)
+        with open(staging, "wb") as f:
+            np.savez(f, tokens=np.array(transcript.tokens, dtype=str), starts=transcript.starts, ends=transcript.ends)
+        return self._commit(key, name, staging)
+
+    def evict(self, keep: Optional[str] = None):
+        """Remove least recently used entries (except keep) until the cache fits in max_bytes."""
+        if self.max_bytes <= 0:
+            return
+        entries = []
+        total = 0
+        for entry in self.root.iterdir():
+            if not entry.is_dir():
+                continue
+            try:
+                size = sum(f.stat().st_size for f in entry.rglob("*") if f.is_file())
+                entries.append((entry.stat().st_mtime, size, entry))
+                total += size
+            except OSError:
+                continue
+        if total <= self.max_bytes:
+            return
+        entries.sort(key=lambda e: e[0])
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry.name == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logger.info(f"Evicted cache entry {entry.name} ({size} bytes)")
+
+_artifact_cache: Optional[ArtifactCache] = None
+
+def get_artifact_cache() -> Optional[ArtifactCache]:
+    """Shared cache instance, or None when caching is disabled."""
+    global _artifact_cache
+    if not config.CACHE_ENABLED:
+        return None
+    if _artifact_cache is None:
+        _artifact_cache = ArtifactCache(config.cache_path, config.CACHE_MAX_BYTES)
+    return _artifact_cache
@@ -1,83 +1,60 @@
 # filepath: d:\Sgroup\Sgroup-AI\video-meet-summarier\app\utils\calc_score.py
 # app/services/scoring.py
 import math
+import heapq
 import logging
+from bisect import bisect_right
+import numpy as np
 from collections import Counter, defaultdict
 from typing import List, Dict, Tuple, Set
 
 from app.config import get_config
-from app.models.base import Segment, TimedWord
+from app.models.transcript import SegmentView
+from app.utils.term_matrix import TermMatrix, build_term_matrix
+from app.utils.metrics import observe_scoring, time_operation
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
+try:
+    import scipy.sparse as sp
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+    logger.warning("SciPy is not available, dominant pair detection falls back to dense NumPy. Install it with: pip install scipy")
+
 config = get_config()
 
-def preprocess_text(text: str) -> str:
-    text_cleaned = ''.join(filter(str.isalnum, text)).lower()
-    return text_cleaned if text_cleaned else None
-
-def calc_term_frrequencies(segments: List[Segment]) ->Tuple[Dict[int, Counter], Counter, float, int, Dict[int, int]]:
-    """Tính tần suất từ, độ dài segment và các thông số cần thiết."""
-    n_i_w = defaultdict(Counter)  # Tần suất từ trong từng segment
-    n_w = Counter()  # Tần suất từ w trên toàn bộ video
-    L_i = {}  # Lưu độ dài (số từ đã lọc) của từng segment
-    total_words_in_video = 0
-    num_segments = len(segments)
-    
-    for segment in segments:
-        filtered_words = []
-        for word in segment.words:
-            filtered_word = preprocess_text(word.word)
-            if filtered_word:
-                filtered_words.append(filtered_word)
-        
-        n_i_w[segment.id].update(filtered_words)
-        n_w.update(filtered_words)
-        L_i[segment.id] = len(filtered_words)
-        total_words_in_video += len(filtered_words)
-    
-    A_L = total_words_in_video / num_segments if num_segments > 0 else 0
-    return n_i_w, n_w, A_L, num_segments, L_i
-  
+# Số hàng (từ) của ma trận đồng xuất hiện được tính trong mỗi khối
+PAIR_BLOCK_ROWS = 512
+
 # tính điểm quan trọng (s_i,w) cho mỗi từ (w) trong mỗi segment (i)
-def calc_word_scores(
-    n_i_w: Dict[int, Counter],
-    n_w: Counter,
-    A_L: float, 
-    num_segments: int,
-    L_i: Dict[int, int],
-) -> Dict[str, float]:
-    """Tính toán điểm cho từng từ."""
-    words_scores = defaultdict(dict)
+def calc_word_scores(term_matrix: TermMatrix) -> np.ndarray:
+    """Tính điểm s(i, w) cho từng phần tử (segment, từ) của term_matrix (vector hóa)."""
     k = config.SCORING_K
     b = config.SCORING_B
-    N = num_segments
+    N = term_matrix.num_segments
     
-    if N == 0: return words_scores
+    if N == 0 or len(term_matrix.counts) == 0: return np.zeros(len(term_matrix.counts))
     
-    inv_doc_freq = {} # Tần suất từ trong toàn bộ video
-    for word, freq in n_w.items():
-        if freq > 0: # xuất hiện ít nhất 1 lần
-            idf_val = math.log(N / freq) if freq < N else 0 # if freq == N thì log (1)=0
-            inv_doc_freq[word] = idf_val
+    # idf = log(N / n_w), bằng 0 khi n_w >= N
+    n_w = term_matrix.term_freq
+    inv_doc_freq = np.where(n_w < N, np.log(N / np.maximum(n_w, 1)), 0.0)
     
-    for segment_id, words in n_i_w.items():
-        Li = L_i.get(segment_id, 0)
-        if Li == 0 or A_L == 0: continue # Bỏ qua segment rỗng
-        
-        part_denominator = k * (1 - b) + b * (Li / A_L)
-        
-        for w, niw in words.items():
-            idf = inv_doc_freq.get(w, 0.0)
-            if niw <= 0: continue
-            
-            numerator = (k + 1) * niw
-            denominator = part_denominator + niw
-            score_siw = (numerator / denominator) * idf
-            words_scores[segment_id][w] = score_siw
-            
-    return words_scores
+    L_i = term_matrix.lengths
+    A_L = L_i.sum() / N
+    part_denominator = k * (1 - b) + b * (L_i / A_L)
+    
+    niw = term_matrix.counts
+    numerator = (k + 1) * niw
+    denominator = part_denominator[term_matrix.rows] + niw
+    return (numerator / denominator) * inv_doc_freq[term_matrix.term_ids]
+
+def calc_segment_scores(term_matrix: TermMatrix, word_scores: np.ndarray) -> np.ndarray:
+    """s(i) = tổng s(i, w) / L_i, bằng 0 với segment rỗng."""
+    L_i = term_matrix.lengths
+    totals = np.bincount(term_matrix.rows, weights=word_scores, minlength=term_matrix.num_segments)
+    return np.divide(totals, L_i, out=np.zeros_like(totals), where=L_i > 0)
 
 def calc_log_likelihood(a, b, c, d, N):
     def log(x):
@@ -93,114 +70,216 @@ def calc_log_likelihood(a, b, c, d, N):
     lambda_val = term1 - term2 - term3 - term4 - term5 + term6
     return max(0.0, lambda_val)
 
+def _xlogx(x: np.ndarray) -> np.ndarray:
+    """x * log(x) theo từng phần tử, quy ước 0 khi x <= 0 (giống calc_log_likelihood)."""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.zeros_like(x)
+    positive = x > 0
+    out[positive] = x[positive] * np.log(x[positive])
+    return out
+
+def calc_log_likelihood_array(a: np.ndarray, b: np.ndarray, c: np.ndarray, d, N: int) -> np.ndarray:
+    """Phiên bản vector hóa của calc_log_likelihood, cùng thứ tự phép tính."""
+    term1 = _xlogx(a) + _xlogx(b) + _xlogx(c) + _xlogx(d)
+    term2 = _xlogx(a + b)
+    term3 = _xlogx(a + c)
+    term4 = _xlogx(b + d)
+    term5 = _xlogx(c + d)
+    term6 = N * math.log(N) if N > 0 else 0.0
+
+    lambda_val = term1 - term2 - term3 - term4 - term5 + term6
+    return np.maximum(0.0, lambda_val)
+
+def _build_incidence_matrix(term_matrix: TermMatrix):
+    """Ma trận nhị phân segment x từ (1 nếu từ xuất hiện trong segment)."""
+    shape = (term_matrix.num_segments, term_matrix.num_terms)
+    data = np.ones(len(term_matrix.term_ids), dtype=np.float32)
+
+    if SCIPY_AVAILABLE:
+        return sp.csr_matrix((data, term_matrix.term_ids, term_matrix.indptr), shape=shape).tocsc()
+    incidence = np.zeros(shape, dtype=np.float32)
+    incidence[term_matrix.rows, term_matrix.term_ids] = 1.0
+    return incidence
+
+def _top_pairs(lambdas: np.ndarray, rows: np.ndarray, cols: np.ndarray, top_n: int):
+    """Giữ top_n theo lambda giảm dần; hòa thì giữ thứ tự (i, j) như vòng lặp gốc."""
+    if len(lambdas) > top_n:
+        threshold = np.partition(lambdas, len(lambdas) - top_n)[len(lambdas) - top_n]
+        keep = lambdas >= threshold
+        lambdas, rows, cols = lambdas[keep], rows[keep], cols[keep]
+    order = np.lexsort((cols, rows, -lambdas))[:top_n]
+    return lambdas[order], rows[order], cols[order]
+
 def detect_dominant_pairs(
-    segments: List[Segment],
-    n_i_w: Dict[int, Counter],
-    num_segments: int,
+    term_matrix: TermMatrix,
     top_n: int
-) -> List[Tuple[int, int, float]]:
-    if num_segments == 0: return []
-    
-    # 1. Lấy tập hợp từ unique cho mỗi segment (đã lọc)
-    segment_pairs: Dict[int, Set[str]] = defaultdict(set)
-    for seg_idx, counts in n_i_w.items():
-        segment_pairs[seg_idx] = set(counts.keys())
-    
-    # 2. Lấy toàn bộ từ vựng (unique, đã lọc)
-    vocab = set()
-    for w_set in segment_pairs.values():
-        vocab.update(w_set)
-    vocab_list = sorted(list(vocab))
-
-    # 3. Tính log-likelihood cho từng cặp
-    pair_likelihoods = []
-    processed_pairs = 0
-    total_pairs = len(vocab_list) * (len(vocab_list) - 1) // 2
-    
-    for i in range(len(vocab_list)):
-        w1 = vocab_list[i]
-        for j in range(i + 1, len(vocab_list)):
-            w2 = vocab_list[j]
-            processed_pairs += 1
-            
-            if processed_pairs % 50000 == 0: # Log tiến trình
-                print(f"Processing pairs: {processed_pairs}/{total_pairs}")
-            
-            a, b, c, d = 0, 0, 0, 0
-            for seg_idx, w_set in segment_pairs.items():
-                has_w1 = w1 in w_set
-                has_w2 = w2 in w_set
-                if has_w1 and has_w2:
-                    a += 1
-                elif has_w1 and not has_w2:
-                    b += 1
-                elif not has_w1 and has_w2:
-                    c += 1
-                else:
-                    d += 1
-            d = num_segments - a - b - c - d
-            
-            if a >= 0 and b >= 0 and c >= 0 and d >= 0:
-                lambda_val = calc_log_likelihood(a, b, c, d, num_segments)
-                if lambda_val > 1e-6:
-                   pair_likelihoods.append((lambda_val, (w1, w2)))
-    
-    # 4. Sắp xếp và lấy top_n cặp có độ khả thi cao nhất
-    pair_likelihoods.sort(reverse=True, key=lambda x: x[0])
-    top_pairs = [pair for _, pair in pair_likelihoods[:top_n]]
-    
-    print(f"Top {top_n} pairs: {top_pairs}")
-    
-    return top_pairs                                   
-
-async def calc_score_segments(segments: List[Segment]) -> List[Segment]:
+) -> List[Tuple[str, str]]:
+    """
+    Tìm top_n cặp từ nổi bật theo log-likelihood.
+
+    Đếm a cho mọi cặp bằng tích ma trận X^T X trên ma trận nhị phân segment x từ,
+    b/c suy ra từ document frequency, lambda tính vector hóa theo từng khối hàng
+    để bộ nhớ không tăng theo V^2.
+    """
+    num_segments = term_matrix.num_segments
+    V = term_matrix.num_terms
+    if num_segments == 0 or top_n <= 0 or V < 2: return []
+    
+    # 1. Ma trận nhị phân và document frequency của từng từ
+    incidence = _build_incidence_matrix(term_matrix)
+    doc_freq = term_matrix.doc_freq.astype(np.float64)
+    # Giữ nguyên cách tính d của vòng lặp cũ: mọi segment đã được đếm vào a/b/c/d,
+    # nên d luôn bằng 0.
+    d = 0.0
+    
+    best_lambdas = np.empty(0, dtype=np.float64)
+    best_rows = np.empty(0, dtype=np.int64)
+    best_cols = np.empty(0, dtype=np.int64)
+    col_idx = np.arange(V)
+    
+    # 2. Tính log-likelihood theo khối hàng: a = X[:, lo:hi]^T X
+    for lo in range(0, V - 1, PAIR_BLOCK_ROWS):
+        hi = min(V - 1, lo + PAIR_BLOCK_ROWS)
+        block = incidence[:, lo:hi].T @ incidence
+        a = block.toarray() if SCIPY_AVAILABLE else block
+        a = np.asarray(a, dtype=np.float64)
+        
+        row_idx = np.arange(lo, hi)
+        b = doc_freq[lo:hi, None] - a
+        c = doc_freq[None, :] - a
+        lambdas = calc_log_likelihood_array(a, b, c, d, num_segments)
+        
+        # chỉ xét cặp (i, j) với j > i và lambda đáng kể
+        valid = (col_idx[None, :] > row_idx[:, None]) & (lambdas > 1e-6)
+        rows, cols = np.nonzero(valid)
+        candidates = _top_pairs(lambdas[rows, cols], rows + lo, cols, top_n)
+        
+        best_lambdas, best_rows, best_cols = _top_pairs(
+            np.concatenate([best_lambdas, candidates[0]]),
+            np.concatenate([best_rows, candidates[1]]),
+            np.concatenate([best_cols, candidates[2]]),
+            top_n,
+        )
+    
+    vocab = term_matrix.vocab
+    top_pairs = [(vocab[i], vocab[j]) for i, j in zip(best_rows.tolist(), best_cols.tolist())]
+    logger.info(f"Top {top_n} pairs (vocabulary size {V}): {top_pairs}")
+    
+    return top_pairs
+
+def detect_dominant_pairs_heap(
+    term_matrix: TermMatrix,
+    top_n: int,
+    min_doc_freq: int = 1,
+) -> List[Tuple[str, str]]:
+    """
+    Tìm top_n cặp từ nổi bật với bộ nhớ giới hạn.
+
+    Chỉ duyệt các cặp thực sự cùng xuất hiện trong một segment (a > 0), đi qua
+    một heap kích thước top_n; từ có document frequency < min_doc_freq bị loại trước.
+    """
+    num_segments = term_matrix.num_segments
+    if num_segments == 0 or top_n <= 0: return []
+    
+    # 1. Loại từ hiếm; term id đã theo thứ tự từ điển như vòng lặp gốc
+    doc_freq = term_matrix.doc_freq.tolist()
+    kept = term_matrix.doc_freq >= min_doc_freq
+    segment_term_ids: List[List[int]] = []
+    for row in range(num_segments):
+        term_ids = term_matrix.segment_terms(row)
+        segment_term_ids.append(term_ids[kept[term_ids]].tolist())
+    postings: List[List[int]] = [[] for _ in range(term_matrix.num_terms)]
+    for row, term_ids in enumerate(segment_term_ids):
+        for term_id in term_ids:
+            postings[term_id].append(row)
+    
+    # d giữ nguyên như detect_dominant_pairs
+    d = 0.0
+    
+    # 2. Với mỗi w1, đếm a cho các w2 > w1 cùng xuất hiện rồi đẩy qua heap
+    heap: List[Tuple[float, int, int]] = []
+    for i in range(term_matrix.num_terms):
+        if not postings[i]:
+            continue
+        co_counts = Counter()
+        for row in postings[i]:
+            term_ids = segment_term_ids[row]
+            co_counts.update(term_ids[bisect_right(term_ids, i):])
+        
+        df1 = doc_freq[i]
+        for j, a in co_counts.items():
+            b = df1 - a
+            c = doc_freq[j] - a
+            lambda_val = calc_log_likelihood(a, b, c, d, num_segments)
+            if lambda_val <= 1e-6:
+                continue
+            # hòa điểm thì ưu tiên cặp (i, j) nhỏ hơn, như sort ổn định của bản gốc
+            item = (lambda_val, -i, -j)
+            if len(heap) < top_n:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    
+    vocab = term_matrix.vocab
+    top_pairs = [(vocab[-i], vocab[-j]) for _, i, j in sorted(heap, reverse=True)]
+    logger.info(f"Top {top_n} pairs (heap search, {int(kept.sum())}/{term_matrix.num_terms} terms kept): {top_pairs}")
+    
+    return top_pairs
+
+def build_pair_index(top_pairs: List[Tuple[str, str]], vocab_index: Dict[str, int]) -> Dict[int, Set[int]]:
+    """Chỉ mục ngược: term id -> tập term id tạo thành cặp nổi bật với nó."""
+    pair_index: Dict[int, Set[int]] = defaultdict(set)
+    for w1, w2 in top_pairs:
+        if w1 == w2: continue
+        id1, id2 = vocab_index[w1], vocab_index[w2]
+        pair_index[id1].add(id2)
+        pair_index[id2].add(id1)
+    return pair_index
+
+def has_dominant_pair(terms_in_segment: Set[int], pair_index: Dict[int, Set[int]]) -> bool:
+    """Segment có chứa ít nhất một cặp nổi bật không (tuyến tính theo số từ của segment)."""
+    for term_id in terms_in_segment:
+        partners = pair_index.get(term_id)
+        if partners and any(p in terms_in_segment for p in partners):
+            return True
+    return False
+
+async def calc_score_segments(segments: List[SegmentView]) -> List[SegmentView]:
     if not segments:
         return []
     
-    N = len(segments)
     # --- Bước 6: Tính Trọng số Đoạn dựa trên Từ đơn ---
-    # 1. Tính tần suất
-    n_i_w, n_w, A_L, _, L_i = calc_term_frrequencies(segments)
+    # 1. Tính tần suất (một lần cho toàn bộ transcript)
+    term_matrix = build_term_matrix(segments)
     
     # 2. Tính điểm cho từng từ s(i, w)
-    words_scores = calc_word_scores(n_i_w, n_w, A_L, N, L_i)
+    word_scores = calc_word_scores(term_matrix)
     
     # 3. Tính điểm cho từng đoạn s(i) = avg(s(i, w))
-    for segment in segments:
-        scores_dict = words_scores.get(segment.id, {})
-        Li = L_i.get(segment.id, 0)
-        if Li > 0 and scores_dict:
-            segment.score = sum(scores_dict.values()) / Li
-        else:
-            segment.score = 0.0
+    segment_scores = calc_segment_scores(term_matrix, word_scores)
     
     # --- Bước 7: Phát hiện Cặp từ Nổi bật & Tăng cường Điểm ---
     # 1. Tìm cặp từ nổi bật
-    top_pairs = detect_dominant_pairs(segments, n_i_w, N, config.DOMINANT_PAIR_COUNT)
-    top_pairs_set = set()
-    
-    for p1, p2 in top_pairs:
-        top_pairs_set.add(tuple(sorted([p1, p2])))
+    with time_operation("dominant-pairs"):
+        if config.DOMINANT_PAIR_SEARCH == "heap":
+            top_pairs = detect_dominant_pairs_heap(term_matrix, config.DOMINANT_PAIR_COUNT, config.DOMINANT_PAIR_MIN_DF)
+        else:
+            top_pairs = detect_dominant_pairs(term_matrix, config.DOMINANT_PAIR_COUNT)
+    observe_scoring(len(term_matrix.vocab), len(top_pairs))
+    pair_index = build_pair_index(top_pairs, term_matrix.vocab_index)
     
     # 2. Tăng cường điểm cho các đoạn chứa cặp từ nổi bật
     boost_factor = config.DOMINANT_PAIR_BOOST
     boosted_count = 0
     
-    if top_pairs_set:
-        for segment in segments:
-            # lay lai tap hop tu unique trong segment
-            words_in_segment = set(n_i_w.get(segment.id, Counter()).keys())
-            word_list = sorted(list(words_in_segment))
-            found_dominant_pair = False
-            
-            for i in range(len(word_list)):
-                for j in range(i + 1, len(word_list)):
-                    pair = tuple(sorted([word_list[i], word_list[j]]))
-                    if pair in top_pairs_set:
-                        segment.score *= boost_factor
-                        found_dominant_pair = True
-                        boosted_count += 1
-                        break
-                if found_dominant_pair:
-                    break
-    return segments
\ No newline at end of file
+    if pair_index:
+        for row in range(term_matrix.num_segments):
+            terms_in_segment = set(term_matrix.segment_terms(row).tolist())
+            if has_dominant_pair(terms_in_segment, pair_index):
+                segment_scores[row] *= boost_factor
+                boosted_count += 1
+    logger.info(f"Boosted {boosted_count} segments based on {len(top_pairs)} dominant pairs.")
+    
+    for segment, score in zip(segments, segment_scores.tolist()):
+        segment.score = score
+    return segments
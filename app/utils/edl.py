@@ -0,0 +1,108 @@
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models.transcript import SegmentView
+
+logger = logging.getLogger(__name__)
+
+EDL_FORMATS = ("json", "cmx", "vtt")
+EDL_SUFFIXES = {"json": ".json", "cmx": ".edl", "vtt": ".vtt"}
+
+def edl_entries(segments: List[SegmentView]) -> List[Dict[str, Any]]:
+    """(start, end, score, text) của các segment đã chọn, theo thứ tự thời gian gốc."""
+    return [
+        {
+            "id": seg.id,
+            "start": round(seg.start_time, 3),
+            "end": round(seg.end_time, 3),
+            "score": seg.score,
+            "text": seg.text,
+        }
+        for seg in sorted(segments, key=lambda s: s.start_time)
+    ]
+
+def _timecode(seconds: float, fps: int) -> str:
+    """Timecode SMPTE non-drop-frame HH:MM:SS:FF."""
+    total_frames = int(round(seconds * fps))
+    frames = total_frames % fps
+    total_seconds = total_frames // fps
+    return f"{total_seconds // 3600:02d}:{total_seconds // 60 % 60:02d}:{total_seconds % 60:02d}:{frames:02d}"
+
+def _vtt_timestamp(seconds: float) -> str:
+    millis = int(round(seconds * 1000))
+    return f"{millis // 3600000:02d}:{millis // 60000 % 60:02d}:{millis // 1000 % 60:02d}.{millis % 1000:03d}"
+
+def range_entries(ranges: List[Tuple[float, float]]) -> List[Dict[str, Any]]:
+    """Các khoảng (start, end) được cắt khi render (segment gần nhau đã gộp)."""
+    return [{"start": round(start, 3), "end": round(end, 3)} for start, end in ranges]
+
+def format_json(entries: List[Dict[str, Any]], cuts: List[Dict[str, Any]], source_name: str,
+                target_duration: int) -> str:
+    return json.dumps({
+        "source": source_name,
+        "target_duration": target_duration,
+        "total_duration": round(sum(c["end"] - c["start"] for c in cuts), 3),
+        "ranges": cuts,
+        "segments": entries,
+    }, ensure_ascii=False, indent=2)
+
+def format_cmx3600(entries: List[Dict[str, Any]], source_name: str, fps: int) -> str:
+    """EDL CMX 3600: mỗi khoảng cắt là một event cut (AV) từ nguồn, nối liên tiếp trên timeline bản ghi."""
+    lines = [f"TITLE: {source_name}", "FCM: NON-DROP FRAME", ""]
+    record_start = 0.0
+    for number, entry in enumerate(entries, start=1):
+        duration = entry["end"] - entry["start"]
+        lines.append(
+            f"{number:03d}  AX       AV    C        "
+            f"{_timecode(entry['start'], fps)} {_timecode(entry['end'], fps)} "
+            f"{_timecode(record_start, fps)} {_timecode(record_start + duration, fps)}"
+        )
+        lines.append(f"* FROM CLIP NAME: {source_name}")
+        lines.append("")
+        record_start += duration
+    return "\n".join(lines)
+
+def format_webvtt(entries: List[Dict[str, Any]]) -> str:
+    """WebVTT theo timeline của video gốc: mỗi segment đã chọn là một cue."""
+    lines = ["WEBVTT", ""]
+    for entry in entries:
+        lines.append(str(entry["id"]))
+        lines.append(f"{_vtt_timestamp(entry['start'])} --> {_vtt_timestamp(entry['end'])}")
+        lines.append(entry["text"].replace("-->", "->"))
+        lines.append("")
+    return "\n".join(lines)
+
+def write_edl(
+    segments: List[SegmentView],
+    output_dir: Path,
+    output_filename_base: str,
+    source_name: str,
+    target_duration: int,
+    formats: List[str],
+    fps: int = 25,
+    ranges: Optional[List[Tuple[float, float]]] = None,
+) -> Dict[str, Path]:
+    """
+    Ghi danh sách segment đã chọn ra các định dạng yêu cầu (json luôn được ghi). Trả về {format: path}.
+    ranges: các khoảng cắt thực sự khi render (None: mỗi segment là một khoảng); CMX dùng các khoảng này.
+    """
+    entries = edl_entries(segments)
+    cuts = range_entries(ranges) if ranges is not None else [{"start": e["start"], "end": e["end"]} for e in entries]
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths: Dict[str, Path] = {}
+    for fmt in ["json"] + [f for f in formats if f != "json"]:
+        if fmt == "json":
+            content = format_json(entries, cuts, source_name, target_duration)
+        elif fmt == "cmx":
+            content = format_cmx3600(cuts, source_name, fps)
+        elif fmt == "vtt":
+            content = format_webvtt(entries)
+        else:
+            raise ValueError(f"Unsupported EDL format: {fmt}")
+        path = output_dir / f"{output_filename_base}{EDL_SUFFIXES[fmt]}"
+        path.write_text(content, encoding="utf-8")
+        paths[fmt] = path
+    logger.info(f"Wrote edit decision list ({', '.join(paths)}) for {len(entries)} segments in {len(cuts)} cuts.")
+    return paths
@@ -1,9 +1,12 @@
 # filepath: d:\Sgroup\Sgroup-AI\video-meet-summarier\app\utils\extract.py
 import os
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import moviepy as mp
-import whisper
 from typing import List, Tuple, Dict, Any, Optional
-from app.models.base import TimedWord
+from app.models.transcript import Transcript
 import asyncio
 from moviepy import VideoFileClip, concatenate_videoclips
 import logging
@@ -23,12 +26,16 @@ except ImportError:
     logger.warning("Azure Speech SDK is not available. Install it with: pip install azure-cognitiveservices-speech")
 
 from app.config import get_config
+from app.utils.metrics import time_operation
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 config = get_config()
 
+# Whisper làm việc trên audio mono 16 kHz
+WHISPER_SAMPLE_RATE = 16000
+
 def create_audio_file(video_path: str, output_path: str) -> bool:
     video = None
     audio = None
@@ -43,9 +50,11 @@ def create_audio_file(video_path: str, output_path: str) -> bool:
             if output_path_str.lower().endswith('.mp3') and config.USE_AZURE_SPEECH:
                 output_path_str = output_path_str[:-4] + '.wav'
                 logger.info(f"Changed output format to WAV for Azure compatibility: {output_path_str}")
-                audio.write_audiofile(output_path_str, codec='pcm_s16le', ffmpeg_params=["-ac", "1", "-ar", "16000"], logger=None)
+                with time_operation("moviepy-audio"):
+                    audio.write_audiofile(output_path_str, codec='pcm_s16le', ffmpeg_params=["-ac", "1", "-ar", "16000"], logger=None)
             else:
-                audio.write_audiofile(output_path_str, codec='libmp3lame', logger=None)  # output like: audio.mp3
+                with time_operation("moviepy-audio"):
+                    audio.write_audiofile(output_path_str, codec='libmp3lame', logger=None)  # output like: audio.mp3
             return True
         else:
             logger.warning(f"Video file {video_path} does not contain an audio track.")
@@ -67,64 +76,250 @@ def create_audio_file(video_path: str, output_path: str) -> bool:
                 logger.error(f"Error closing video object: {e_close}")
                 pass
             
+def convert_audio_file(media_path: str | Path, output_path: str | Path) -> bool:
+    """
+    Ghi audio track của media_path ra output_path bằng ffmpeg, không mở luồng video (-vn).
+    Dùng cho file chỉ có audio (WAV/MP3/M4A...) mà moviepy.VideoFileClip không mở được.
+    .wav: PCM 16-bit mono 16 kHz (định dạng Azure yêu cầu); còn lại: MP3.
+    """
+    output_path = Path(output_path)
+    if output_path.suffix.lower() == ".wav":
+        codec_args = ["-acodec", "pcm_s16le", "-ac", "1", "-ar", "16000"]
+    else:
+        codec_args = ["-acodec", "libmp3lame"]
+    command = ["ffmpeg", "-y", "-nostdin", "-v", "error", "-i", str(media_path), "-vn", "-sn", "-dn", *codec_args, str(output_path)]
+    try:
+        with time_operation("convert-audio"):
+            result = subprocess.run(command, capture_output=True, check=False)
+    except Exception as e:
+        logger.error(f"An error occurred while running ffmpeg: {e}", exc_info=True)
+        return False
+    if result.returncode != 0 or not output_path.exists():
+        logger.error(f"ffmpeg audio conversion failed with exit code {result.returncode}: "
+                     f"{result.stderr.decode('utf-8', errors='ignore')}")
+        return False
+    return True
+
+def extract_audio_pcm(media_path: str | Path, sample_rate: int = WHISPER_SAMPLE_RATE) -> Optional[np.ndarray]:
+    """
+    Decode only the audio track of media_path to mono float32 PCM in memory.
+
+    Runs a single ffmpeg process with the video stream disabled (-vn); the result
+    can be passed straight to whisper_model.transcribe without an intermediate file.
+    """
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        "-v", "error",
+        "-i", str(media_path),
+        "-vn", "-sn", "-dn",       # chỉ giải mã audio
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "-f", "s16le",
+        "-acodec", "pcm_s16le",
+        "pipe:1",
+    ]
+    try:
+        logger.info(f"Decoding audio track of {media_path} to {sample_rate} Hz mono PCM")
+        with time_operation("extract-pcm"):
+            result = subprocess.run(command, capture_output=True, check=False)
+    except Exception as e:
+        logger.error(f"An error occurred while running ffmpeg: {e}", exc_info=True)
+        return None
+
+    if result.returncode != 0:
+        logger.error(f"ffmpeg audio decoding failed with exit code {result.returncode}: "
+                     f"{result.stderr.decode('utf-8', errors='ignore')}")
+        return None
+    if not result.stdout:
+        logger.warning(f"File {media_path} does not contain an audio track.")
+        return None
+
+    # Cùng cách chuẩn hóa với whisper.audio.load_audio
+    audio = np.frombuffer(result.stdout, np.int16).astype(np.float32) / 32768.0
+    logger.info(f"Decoded {audio.shape[0] / sample_rate:.1f}s of audio.")
+    return audio
+
 def load_whisper_model(model_name: str = "base") -> Optional[Any]:
     model = None
     try:
+        # Import lazily: whisper pulls in torch, which is not needed for Azure / Whisper API
+        import whisper
         # model = whisper.load_model(model_name, device="cuda")
         model = whisper.load_model(model_name)
     except Exception as e:
         logger.error(f"Failed to load Whisper model '{model_name}': {e}", exc_info=True)
     return model
 
-def extract_transcript_whisper(audio_path: str | Path, whisper_model: Any) -> List[TimedWord]:
+def extract_transcript_whisper(audio_path: str | Path | np.ndarray, whisper_model: Any) -> Transcript:
     """
-    Extract transcript using local Whisper model
+    Extract transcript using local Whisper model.
+    audio_path may also be a 16 kHz mono float32 PCM array (see extract_audio_pcm).
     """
     if whisper_model is None:
         logger.error("Whisper model is not loaded. Cannot perform speech recognition.")
-        return []
-    
-    # Convert Path object to string if needed
-    audio_path_str = str(audio_path) if isinstance(audio_path, Path) else audio_path
+        return Transcript.empty()
     
-    if not os.path.exists(audio_path_str):
-        logger.error(f"Audio file not found at path: {audio_path_str}")
-        return [] 
+    if isinstance(audio_path, np.ndarray):
+        audio_input = audio_path
+        audio_desc = f"in-memory PCM ({audio_path.shape[0] / WHISPER_SAMPLE_RATE:.1f}s)"
+    else:
+        # Convert Path object to string if needed
+        audio_input = str(audio_path) if isinstance(audio_path, Path) else audio_path
+        audio_desc = audio_input
+        
+        if not os.path.exists(audio_input):
+            logger.error(f"Audio file not found at path: {audio_input}")
+            return Transcript.empty()
     try:
-        logger.info(f"Processing audio with Whisper model: {audio_path_str}")
-        result = whisper_model.transcribe(audio_path_str, word_timestamps=True)
+        logger.info(f"Processing audio with Whisper model: {audio_desc}")
+        result = whisper_model.transcribe(audio_input, word_timestamps=True)
         segments = result["segments"]
 
-        transcripts = []
-        for segment in segments:
-            words = segment["words"]
-            for word in words:
-                word_info = TimedWord(
-                    word=word["word"],
-                    start=word["start"],
-                    end=word["end"]
-                )
-                transcripts.append(word_info)
+        transcripts = Transcript.from_words(
+            (word["word"], word["start"], word["end"])
+            for segment in segments
+            for word in segment["words"]
+        )
         logger.info(f"Whisper transcription completed. Found {len(transcripts)} words.")
         return transcripts
     except Exception as e:
         logger.error(f"An error occurred during Whisper speech recognition: {e}", exc_info=True)
-        return []
+        return Transcript.empty()
+
+def find_silence_cut_points(
+    audio: np.ndarray,
+    chunk_seconds: float,
+    search_seconds: float = 30.0,
+    frame_seconds: float = 0.02,
+    sample_rate: int = WHISPER_SAMPLE_RATE,
+) -> List[int]:
+    """
+    Sample offsets splitting audio into chunks of roughly chunk_seconds.
+
+    Each cut is placed at the quietest frame (lowest mean energy) within
+    +/- search_seconds of the nominal position, so words are not split.
+    Returns [0, cut_1, ..., len(audio)].
+    """
+    frame = max(1, int(frame_seconds * sample_rate))
+    num_frames = len(audio) // frame
+    chunk_frames = max(1, int(chunk_seconds / frame_seconds))
+    search_frames = max(1, int(search_seconds / frame_seconds))
+    if num_frames == 0:
+        return [0, len(audio)]
+
+    energy = np.square(audio[:num_frames * frame].reshape(num_frames, frame), dtype=np.float32).mean(axis=1)
+
+    cuts = [0]
+    last = 0
+    # chỉ cắt khi phần còn lại đủ dài để không tạo chunk cuối quá ngắn
+    while last + chunk_frames + search_frames < num_frames:
+        target = last + chunk_frames
+        lo = max(last + 1, target - search_frames)
+        hi = min(num_frames, target + search_frames)
+        last = lo + int(np.argmin(energy[lo:hi]))
+        cuts.append(last * frame)
+    cuts.append(len(audio))
+    return cuts
+
+# Model replica của từng worker process (xem _init_transcribe_worker)
+_worker_model = None
+
+def _init_transcribe_worker(model_name: str, num_threads: int):
+    global _worker_model
+    import torch
+    torch.set_num_threads(num_threads)
+    _worker_model = load_whisper_model(model_name)
+
+def _worker_model_size() -> int:
+    """Kích thước model replica trong worker (registry tính pool vào WHISPER_MEMORY_BUDGET_MB)."""
+    from app.utils.model_registry import model_size_bytes
+    return model_size_bytes(_worker_model)
+
+def _transcribe_chunk(audio_chunk: np.ndarray, offset_seconds: float) -> List[Tuple[str, float, float]]:
+    result = _worker_model.transcribe(audio_chunk, word_timestamps=True)
+    return [
+        (word["word"], word["start"] + offset_seconds, word["end"] + offset_seconds)
+        for segment in result["segments"]
+        for word in segment["words"]
+    ]
+
+def create_transcribe_pool(model_name: str) -> Tuple[ProcessPoolExecutor, int]:
+    """
+    Pool mới gồm các process giữ một replica của model; trả về (pool, số worker).
+    Dùng get_transcribe_pool(): pool được WhisperModelRegistry giữ lại và tính vào ngân sách bộ nhớ.
+    """
+    threads = max(1, config.WHISPER_THREADS_PER_WORKER)
+    workers = config.WHISPER_WORKERS or max(1, (os.cpu_count() or 1) // threads)
+    logger.info(f"Starting {workers} Whisper '{model_name}' workers with {threads} threads each.")
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),  # torch không an toàn với fork
+        initializer=_init_transcribe_worker,
+        initargs=(model_name, threads),
+    )
+    return pool, workers
+
+def get_transcribe_pool(model_name: str) -> Optional[ProcessPoolExecutor]:
+    """Pool of Whisper model replicas, one per model, cached by the model registry (LRU + memory budget)."""
+    from app.utils.model_registry import get_model_registry
+    return get_model_registry().get_pool(model_name)
+
+def stitch_chunk_words(chunks: List[List[Tuple[str, float, float]]]) -> Transcript:
+    """Ghép từ của các chunk theo thứ tự, bỏ các từ bị lặp lại ở ranh giới chunk."""
+    words: List[Tuple[str, float, float]] = []
+    for chunk_words in chunks:
+        last_end = words[-1][2] if words else float("-inf")
+        for word in chunk_words:
+            # từ bắt đầu trước khi từ cuối của chunk trước kết thúc là đã được nhận dạng rồi
+            if word[1] < last_end - 1e-3:
+                continue
+            words.append(word)
+    return Transcript.from_words(words)
+
+def extract_transcript_whisper_parallel(audio_path: str | Path | np.ndarray, model_name: str) -> Transcript:
+    """
+    Extract transcript by splitting audio at silences into ~WHISPER_CHUNK_MINUTES chunks
+    and transcribing them concurrently in a pool of Whisper model replicas.
+    """
+    audio = audio_path if isinstance(audio_path, np.ndarray) else extract_audio_pcm(audio_path)
+    if audio is None or len(audio) == 0:
+        logger.error("No audio to transcribe.")
+        return Transcript.empty()
+
+    try:
+        cuts = find_silence_cut_points(audio, config.WHISPER_CHUNK_MINUTES * 60)
+        logger.info(f"Transcribing {len(audio) / WHISPER_SAMPLE_RATE:.1f}s of audio in {len(cuts) - 1} chunks.")
+
+        pool = get_transcribe_pool(model_name)
+        if pool is None:
+            logger.error(f"Failed to start Whisper '{model_name}' workers.")
+            return Transcript.empty()
+        futures = [
+            pool.submit(_transcribe_chunk, audio[start:end], start / WHISPER_SAMPLE_RATE)
+            for start, end in zip(cuts[:-1], cuts[1:])
+        ]
+        transcripts = stitch_chunk_words([future.result() for future in futures])
+        logger.info(f"Parallel Whisper transcription completed. Found {len(transcripts)} words.")
+        return transcripts
+    except Exception as e:
+        logger.error(f"An error occurred during parallel Whisper speech recognition: {e}", exc_info=True)
+        return Transcript.empty()
 
-def extract_transcript_azure(audio_path: str | Path) -> List[TimedWord]:
+def extract_transcript_azure(audio_path: str | Path) -> Transcript:
     """
     Extract transcript using Azure Speech Service
     """
     if not AZURE_SPEECH_SDK_AVAILABLE:
         logger.error("Azure Speech SDK is not available. Cannot perform speech recognition.")
-        return []
+        return Transcript.empty()
     
     # Convert Path object to string if needed
     audio_path_str = str(audio_path) if isinstance(audio_path, Path) else audio_path
     
     if not os.path.exists(audio_path_str):
         logger.error(f"Audio file not found at path: {audio_path_str}")
-        return []
+        return Transcript.empty()
         
     try:
         logger.info(f"Processing audio with Azure Speech Service: {audio_path_str}")
@@ -135,7 +330,7 @@ def extract_transcript_azure(audio_path: str | Path) -> List[TimedWord]:
         
         if not speech_key:
             logger.error("Azure Speech Service key is not configured. Check your environment variables.")
-            return []
+            return Transcript.empty()
             
         # Configure speech config
         speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=service_region)
@@ -175,12 +370,7 @@ def extract_transcript_azure(audio_path: str | Path) -> List[TimedWord]:
                                 offset_sec = word['Offset'] / 10000000  # Convert from 100-nanosecond units to seconds
                                 duration_sec = word['Duration'] / 10000000
                                 
-                                word_info = TimedWord(
-                                    word=word['Word'],
-                                    start=offset_sec,
-                                    end=offset_sec + duration_sec
-                                )
-                                words_with_timestamps.append(word_info)
+                                words_with_timestamps.append((word['Word'], offset_sec, offset_sec + duration_sec))
             
             elif evt.result.reason == speechsdk.ResultReason.NoMatch:
                 logger.warning(f"NOMATCH: {evt.result.no_match_details}")
@@ -206,13 +396,13 @@ def extract_transcript_azure(audio_path: str | Path) -> List[TimedWord]:
             time.sleep(0.5)
         
         logger.info(f"Azure transcription completed. Found {len(words_with_timestamps)} words.")
-        return sorted(words_with_timestamps, key=lambda x: x.start)
+        return Transcript.from_words(sorted(words_with_timestamps, key=lambda x: x[1]))
         
     except Exception as e:
         logger.error(f"An error occurred during Azure speech recognition: {e}", exc_info=True)
-        return []
+        return Transcript.empty()
 
-def extract_transcript(audio_path: str | Path, whisper_model: Any = None) -> List[TimedWord]:
+def extract_transcript(audio_path: str | Path | np.ndarray, whisper_model: Any = None) -> Transcript:
     """
     Extracts transcript from audio, using either Whisper or Azure Speech Service
     """
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import shlex
+from collections import deque
+from typing import Callable, List, Optional
+
+from app.config import get_config
+from app.utils.metrics import time_operation
+
+logger = logging.getLogger(__name__)
+
+config = get_config()
+
+# (stage, percent 0-100) - báo tiến độ từng bước của pipeline lên trạng thái task
+ProgressCallback = Callable[[str, float], None]
+
+STDERR_TAIL_LINES = 50
+
+class FFmpegResult:
+    """Kết quả một lần chạy ffmpeg: mã thoát và các dòng stderr cuối cùng."""
+    __slots__ = ("returncode", "stderr_tail", "timed_out")
+
+    def __init__(self, returncode: int, stderr_tail: List[str], timed_out: bool = False):
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+        self.timed_out = timed_out
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+    @property
+    def stderr(self) -> str:
+        return "\n".join(self.stderr_tail)
+
+def stage_reporter(progress_callback: Optional[ProgressCallback], stage: str) -> Optional[Callable[[float], None]]:
+    """Gắn tên bước vào callback tiến độ, để hàm cấp thấp chỉ cần báo phần trăm."""
+    if progress_callback is None:
+        return None
+    return lambda percent: progress_callback(stage, percent)
+
+async def _read_progress(stream: asyncio.StreamReader, duration: Optional[float], on_progress: Optional[Callable[[float], None]]):
+    """Đọc output key=value của -progress pipe:1 và quy ra phần trăm theo thời lượng output."""
+    last_percent = -1.0
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        key, _, value = line.decode("utf-8", errors="ignore").strip().partition("=")
+        percent = None
+        if key == "out_time_us" and duration:
+            try:
+                percent = min(100.0, max(0.0, int(value) / 1e6 / duration * 100.0))
+            except ValueError:
+                continue
+        elif key == "progress" and value == "end":
+            percent = 100.0
+        # Chỉ báo khi tăng ít nhất 1% để không cập nhật trạng thái quá dày
+        if percent is not None and on_progress and (percent >= last_percent + 1.0 or percent == 100.0):
+            last_percent = percent
+            on_progress(percent)
+
+async def _read_stderr(stream: asyncio.StreamReader, tail: deque, log_prefix: str):
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        text = line.decode("utf-8", errors="ignore").rstrip()
+        if text:
+            tail.append(text)
+            logger.debug(f"[{log_prefix}] {text}")
+
+async def _kill(process: asyncio.subprocess.Process):
+    if process.returncode is not None:
+        return
+    process.kill()
+    try:
+        await asyncio.wait_for(process.wait(), timeout=10)
+    except asyncio.TimeoutError:
+        logger.warning(f"ffmpeg process {process.pid} did not exit after kill.")
+
+async def run_ffmpeg(
+    command: List[str],
+    duration: Optional[float] = None,
+    on_progress: Optional[Callable[[float], None]] = None,
+    timeout: Optional[float] = None,
+    log_prefix: str = "ffmpeg",
+) -> FFmpegResult:
+    """
+    Chạy một lệnh ffmpeg (command[0] là 'ffmpeg') bằng asyncio subprocess, không chiếm thread của executor.
+
+    Args:
+        command: Lệnh ffmpeg đầy đủ; '-progress pipe:1 -nostats' được chèn tự động.
+        duration: Thời lượng output dự kiến (giây) để tính phần trăm hoàn thành.
+        on_progress: Gọi với phần trăm (0-100) khi ffmpeg tiến triển.
+        timeout: Giới hạn thời gian (giây); None dùng config.FFMPEG_TIMEOUT, 0 là không giới hạn.
+
+    Tiến trình bị kill khi hết thời gian hoặc khi coroutine bị hủy (CancelledError được raise lại).
+    """
+    full_command = [command[0], '-progress', 'pipe:1', '-nostats', *command[1:]]
+    timeout = config.FFMPEG_TIMEOUT if timeout is None else timeout
+    logger.info(f"Running FFmpeg command: {shlex.join(full_command)}")
+
+    process = await asyncio.create_subprocess_exec(
+        *full_command,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    tail: deque = deque(maxlen=STDERR_TAIL_LINES)
+
+    async def communicate():
+        await asyncio.gather(
+            _read_progress(process.stdout, duration, on_progress),
+            _read_stderr(process.stderr, tail, log_prefix),
+        )
+        return await process.wait()
+
+    try:
+        with time_operation(log_prefix):
+            returncode = await asyncio.wait_for(communicate(), timeout=timeout or None)
+    except asyncio.TimeoutError:
+        logger.error(f"FFmpeg timed out after {timeout}s, killing process {process.pid}.")
+        await _kill(process)
+        return FFmpegResult(process.returncode if process.returncode is not None else -1, list(tail), timed_out=True)
+    except asyncio.CancelledError:
+        logger.warning(f"FFmpeg cancelled, killing process {process.pid}.")
+        await _kill(process)
+        raise
+    return FFmpegResult(returncode, list(tail))
@@ -0,0 +1,60 @@
+import os
+from email.utils import parsedate
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Receive, Scope, Send
+
+PATHSEND_EXTENSION = "http.response.pathsend"
+
+def is_not_modified(response_headers: Headers, request_headers: Headers) -> bool:
+    """True nếu If-None-Match / If-Modified-Since của request khớp với file hiện tại (trả về 304)."""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = response_headers.get("etag")
+        return etag in [tag.strip(" W/") for tag in if_none_match.split(",")]
+
+    if_modified_since = parsedate(request_headers.get("if-modified-since", ""))
+    last_modified = parsedate(response_headers.get("last-modified", ""))
+    return if_modified_since is not None and last_modified is not None and if_modified_since >= last_modified
+
+class SummaryFileResponse(FileResponse):
+    """
+    FileResponse cho video tóm tắt.
+
+    Range/206, ETag và Last-Modified do FileResponse xử lý; lớp này bổ sung:
+    - 304 Not Modified khi If-None-Match / If-Modified-Since khớp,
+    - gửi cả file bằng extension http.response.pathsend (server tự sendfile, không copy qua Python)
+      khi ASGI server hỗ trợ, nếu không thì đọc theo khối lớn hơn mặc định. Uvicorn (0.34) không hỗ trợ
+      pathsend: với nó file luôn đi qua Python, muốn sendfile thì dùng reverse proxy (xem README).
+    """
+    chunk_size = 1024 * 1024
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.stat_result is None:
+            try:
+                self.stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+            except FileNotFoundError:
+                raise RuntimeError(f"File at path {self.path} does not exist.")
+            self.set_stat_headers(self.stat_result)
+
+        request_headers = Headers(scope=scope)
+        if is_not_modified(self.headers, request_headers):
+            await NotModifiedResponse(self.headers)(scope, receive, send)
+            return
+
+        use_pathsend = (
+            PATHSEND_EXTENSION in scope.get("extensions", {})
+            and "range" not in request_headers
+            and scope["method"].upper() != "HEAD"
+        )
+        if not use_pathsend:
+            await super().__call__(scope, receive, send)
+            return
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        await send({"type": PATHSEND_EXTENSION, "path": os.fspath(self.path)})
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from app.config import get_config
+from app.utils.ffmpeg_runner import run_ffmpeg
+from app.utils.video_processor import build_trim_concat_filter, probe_media_streams
+
+logger = logging.getLogger(__name__)
+
+config = get_config()
+
+PLAYLIST_NAME = "index.m3u8"
+# Loại file trong thư mục HLS: playlist, init segment và fragment fMP4 (ffmpeg đặt tên index<N>.m4s)
+HLS_MEDIA_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".mp4": "video/mp4",
+    ".m4s": "video/iso.segment",
+}
+
+def hls_dir(output_filename_base: str) -> Path:
+    return config.SUMMARY_DIR / "hls" / output_filename_base
+
+def prune_hls_dirs(keep: Optional[str] = None):
+    """Xóa thư mục HLS cũ hơn HLS_RETENTION_SECONDS (0 = giữ mãi), trừ keep."""
+    root = config.SUMMARY_DIR / "hls"
+    if config.HLS_RETENTION_SECONDS <= 0 or not root.is_dir():
+        return
+    cutoff = time.time() - config.HLS_RETENTION_SECONDS
+    for entry in root.iterdir():
+        try:
+            if entry.is_dir() and entry.name != keep and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry, ignore_errors=True)
+                logger.info(f"Removed expired HLS output {entry.name}")
+        except OSError:
+            continue
+
+def _tee_path(path: Path) -> str:
+    """Đường dẫn output cho muxer tee: '\\', '|' và "'" là ký tự đặc biệt, phải escape."""
+    escaped = path.as_posix()
+    for char in ("\\", "|", "'"):
+        escaped = escaped.replace(char, "\\" + char)
+    return escaped
+
+async def render_ranges_hls(
+    input_path: Path,
+    ranges: List[Tuple[float, float]],
+    output_filename_base: str,
+    final_summary_path: Path,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> bool:
+    """
+    Render các khoảng bằng một lệnh ffmpeg (trim/concat như render thường, mã hóa một lần) và ghi
+    cùng lúc qua muxer tee: playlist HLS EVENT với fragment fMP4 (playlist được ffmpeg ghi lại mỗi khi
+    một fragment xong, nên client xem được phần đầu trong lúc phần sau còn đang render) và
+    final_summary_path để tải về như bình thường. Một bộ mã hóa audio duy nhất nên không có khe hở
+    hay tiếng "bụp" giữa các fragment.
+    """
+    directory = hls_dir(output_filename_base)
+    prune_hls_dirs(keep=output_filename_base)
+    shutil.rmtree(directory, ignore_errors=True)
+    directory.mkdir(parents=True, exist_ok=True)
+    final_summary_path.parent.mkdir(parents=True, exist_ok=True)
+
+    loop = asyncio.get_running_loop()
+    streams = await loop.run_in_executor(None, probe_media_streams, input_path)
+    if not streams["video"] and not streams["audio"]:
+        logger.error(f"Input {input_path} has neither video nor audio streams.")
+        return False
+
+    fragment_seconds = config.HLS_FRAGMENT_SECONDS
+    hls_options = ":".join([
+        "f=hls",
+        f"hls_time={fragment_seconds:g}",
+        "hls_playlist_type=event",
+        "hls_segment_type=fmp4",
+        # temp_file: fragment và playlist được ghi ra file tạm rồi đổi tên, client không đọc phải file ghi dở
+        "hls_flags=temp_file+independent_segments",
+    ])
+    command = [
+        'ffmpeg', '-y', '-nostdin',
+        '-i', str(input_path),
+        '-filter_complex', build_trim_concat_filter(ranges, streams["video"], streams["audio"]),
+    ]
+    if streams["video"]:
+        # Keyframe đều đặn để ffmpeg cắt fragment đúng HLS_FRAGMENT_SECONDS
+        command += ['-map', '[outv]', '-c:v', 'libx264', '-preset', 'fast', '-crf', '23',
+                    '-force_key_frames', f"expr:gte(t,n_forced*{fragment_seconds:g})"]
+    if streams["audio"]:
+        command += ['-map', '[outa]', '-c:a', 'aac']
+    command += [
+        # tee không có cờ global header: MP4 và fMP4 cần extradata của bộ mã hóa
+        '-flags', '+global_header',
+        '-f', 'tee',
+        f"[{hls_options}]{_tee_path(directory / PLAYLIST_NAME)}"
+        f"|[f=mp4:movflags=+faststart]{_tee_path(final_summary_path)}",
+    ]
+    logger.info(f"Rendering {len(ranges)} ranges as HLS into {directory} and {final_summary_path}...")
+
+    result = await run_ffmpeg(
+        command,
+        duration=sum(end - start for start, end in ranges),
+        on_progress=on_progress,
+        log_prefix="hls",
+    )
+    if not result.ok or not final_summary_path.exists() or final_summary_path.stat().st_size == 0:
+        logger.error(f"HLS rendering failed with exit code {result.returncode}:\n{result.stderr}")
+        shutil.rmtree(directory, ignore_errors=True)
+        final_summary_path.unlink(missing_ok=True)
+        return False
+    return True
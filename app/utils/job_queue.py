@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import get_config
+from app.utils.metrics import observe_job, set_job_gauges
+
+logger = logging.getLogger(__name__)
+
+config = get_config()
+
+# Trong process worker: hàng đợi gửi (task_id, stage, percent) về process API
+_progress_queue = None
+
+def _init_job_worker(progress_queue, warmup_models: List[str]):
+    global _progress_queue
+    _progress_queue = progress_queue
+    # Model Whisper nằm trong process worker, nên warm-up ở đây thay vì ở process API
+    if warmup_models:
+        try:
+            from app.utils.model_registry import get_model_registry
+            get_model_registry().warm_up(warmup_models)
+        except Exception as e:
+            logger.error(f"Whisper warm-up failed in job worker {os.getpid()}: {e}")
+
+def _noop():
+    """Job rỗng gửi cho từng worker khi khởi động, để pool tạo process (và warm-up) ngay."""
+
+def _run_summary_job(task_id: str, kwargs: Dict[str, Any], profile: bool = False):
+    # Import trong worker: process API không phải nạp whisper/torch/moviepy
+    from app.utils.pipeline import summary_video
+
+    def report(stage: str, percent: float):
+        _progress_queue.put((task_id, stage, percent))
+
+    # Đo trước khi chạy: pipeline xóa file upload khi xong
+    input_bytes = os.path.getsize(kwargs["video_path"]) if os.path.exists(kwargs["video_path"]) else 0
+    started = time.perf_counter()
+    status = "failed"
+    if profile:
+        from app.utils.profiling import profile_task
+        profiling = profile_task(task_id)
+    else:
+        profiling = nullcontext()
+    try:
+        with profiling:
+            result = asyncio.run(summary_video(progress_callback=report, **kwargs))
+        if result:
+            status = "completed"
+        return result
+    finally:
+        observe_job(status, time.perf_counter() - started, input_bytes)
+
+class JobQueue:
+    """
+    Pool process (spawn) chạy pipeline tóm tắt ngoài process API.
+
+    Tối đa `workers` job chạy cùng lúc, các job còn lại chờ trong pool. Giới hạn số job nhận vào
+    không nằm ở đây mà ở task store (TaskStore.create(limit=...)), đếm task chưa xong của process này
+    trong cùng transaction tạo task. Tiến độ từ worker đi qua một multiprocessing.Queue, được một thread
+    trong process API đọc và chuyển cho callback của từng task.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._progress_queue = None
+        self._listener: Optional[threading.Thread] = None
+        self._progress_handlers: Dict[str, Callable[[str, float], None]] = {}
+        self._reserved = 0
+        self._submitted = 0
+
+    @property
+    def depth(self) -> int:
+        """Số job đã nhận (đang chạy + đang chờ)."""
+        return self._reserved
+
+    def start(self):
+        if self._executor is not None:
+            return
+        context = multiprocessing.get_context("spawn")
+        self._progress_queue = context.Queue()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_job_worker,
+            initargs=(self._progress_queue, config.WHISPER_WARMUP_MODELS),
+        )
+        self._listener = threading.Thread(target=self._listen, name="job-progress", daemon=True)
+        self._listener.start()
+        # ProcessPoolExecutor chỉ tạo process khi có job: gửi mỗi worker một job rỗng để warm-up
+        # Whisper chạy ngay lúc khởi động thay vì trên job đầu tiên
+        for _ in range(self.workers):
+            self._executor.submit(_noop)
+        logger.info(f"Job queue started: {self.workers} workers.")
+
+    def _listen(self):
+        while True:
+            item = self._progress_queue.get()
+            if item is None:
+                break
+            task_id, stage, percent = item
+            handler = self._progress_handlers.get(task_id)
+            if handler is None:
+                continue
+            try:
+                handler(stage, percent)
+            except Exception as e:
+                logger.error(f"Progress handler for task {task_id} failed: {e}")
+
+    def reserve(self):
+        """Tính một job đã nhận (đang lưu upload hoặc chờ worker) cho tới khi run() xong hoặc release()."""
+        self._reserved += 1
+        self._update_gauges()
+
+    def release(self):
+        self._reserved = max(0, self._reserved - 1)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        # Pool nhận job theo thứ tự: tối đa `workers` job đã submit đang chạy, còn lại đang chờ
+        active = min(self._submitted, self.workers)
+        set_job_gauges(queued=self._reserved - active, active=active)
+
+    async def run(self, task_id: str, on_progress: Optional[Callable[[str, float], None]] = None,
+                  profile: bool = False, **kwargs):
+        """
+        Chạy summary_video(**kwargs) trong một worker với chỗ đã reserve(), trả về kết quả của nó.
+        profile=True: chạy dưới cProfile + tracemalloc (xem app.utils.profiling).
+        """
+        if self._executor is None:
+            self.start()
+        executor = self._executor
+        future = None
+        if on_progress:
+            self._progress_handlers[task_id] = on_progress
+        try:
+            future = executor.submit(_run_summary_job, task_id, kwargs, profile)
+            self._submitted += 1
+            self._update_gauges()
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            # Một worker chết (OOM, segfault...): tạo lại pool cho các job sau
+            logger.error(f"Job worker died while processing task {task_id}, restarting the pool.")
+            self._restart(executor)
+            raise
+        finally:
+            self._progress_handlers.pop(task_id, None)
+            if future is not None:
+                self._submitted -= 1
+            self.release()
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        # Nhiều job cùng gặp pool hỏng: chỉ job đầu tiên tạo lại pool
+        if self._executor is not broken:
+            return
+        self._executor = None
+        broken.shutdown(wait=False, cancel_futures=False)
+        self._progress_queue.put(None)
+        self.start()
+
+    def shutdown(self):
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._progress_queue.put(None)
+        self._listener.join(timeout=5)
+        self._executor = None
+        logger.info("Job queue stopped.")
+
+_job_queue: Optional[JobQueue] = None
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(config.JOB_WORKERS)
+    return _job_queue
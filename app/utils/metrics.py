@@ -0,0 +1,137 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Tuple
+
+from app.config import get_config
+
+logger = logging.getLogger(__name__)
+
+config = get_config()
+
+# Pipeline chạy trong các process job worker: prometheus_client ghi số liệu của mọi process
+# vào PROMETHEUS_MULTIPROC_DIR, biến môi trường phải có trước khi import prometheus_client
+# (process con spawn kế thừa biến này từ process API). Không xóa thư mục ở đây: mọi process
+# (worker uvicorn, job worker, script) đều import module này; số liệu cũ được xóa một lần
+# bởi launcher (python -m app) trước khi các process khởi động.
+if config.METRICS_ENABLED and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(config.METRICS_DIR)
+    config.METRICS_DIR.mkdir(parents=True, exist_ok=True)
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        REGISTRY,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+        multiprocess,
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+METRICS_ACTIVE = config.METRICS_ENABLED and PROMETHEUS_AVAILABLE
+
+# Bước pipeline: vài giây (segment/score) đến hàng chục phút (ASR/render video dài)
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+SIZE_BUCKETS = (10, 30, 100, 300, 1000, 3000, 10000, 30000, 100000)
+
+if METRICS_ACTIVE:
+    STAGE_SECONDS = Histogram(
+        "summary_stage_seconds", "Duration of each pipeline stage", ["stage"], buckets=DURATION_BUCKETS)
+    OPERATION_SECONDS = Histogram(
+        "summary_operation_seconds", "Duration of ffmpeg/moviepy calls and heavy computations",
+        ["operation"], buckets=DURATION_BUCKETS)
+    JOB_SECONDS = Histogram(
+        "summary_job_seconds", "End-to-end duration of summary jobs in a worker", ["status"], buckets=DURATION_BUCKETS)
+    JOBS_TOTAL = Counter("summary_jobs", "Finished summary jobs", ["status"])
+    WORDS_TOTAL = Counter("summary_words", "Transcribed words")
+    SEGMENTS_TOTAL = Counter("summary_segments", "Transcript segments produced by segmentation")
+    INPUT_BYTES_TOTAL = Counter("summary_input_bytes", "Bytes of uploaded media processed")
+    VOCABULARY_SIZE = Histogram("summary_vocabulary_size", "Distinct terms per transcript", buckets=SIZE_BUCKETS)
+    DOMINANT_PAIRS = Histogram(
+        "summary_dominant_pairs", "Dominant word pairs found per transcript", buckets=(0, 1, 5, 10, 20, 30, 50, 100))
+    QUEUE_DEPTH = Gauge("summary_queue_depth", "Jobs waiting for a job worker", multiprocess_mode="livesum")
+    ACTIVE_JOBS = Gauge("summary_active_jobs", "Jobs running in job workers", multiprocess_mode="livesum")
+
+@contextmanager
+def time_operation(operation: str) -> Iterator[None]:
+    """Đo thời gian một lời gọi (ffmpeg, moviepy, detect_dominant_pairs...)."""
+    if not METRICS_ACTIVE:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        OPERATION_SECONDS.labels(operation).observe(time.perf_counter() - started)
+
+class StageTimer:
+    """
+    Đo thời gian các bước nối tiếp nhau của pipeline: mỗi lần callback tiến độ báo một bước mới
+    thì bước trước được ghi nhận. Dùng chung chỗ chuyển bước với trạng thái task.
+    """
+
+    def __init__(self):
+        self.stage: Optional[str] = None
+        self.started = 0.0
+
+    def wrap(self, progress_callback: Optional[Callable[[str, float], None]]) -> Optional[Callable[[str, float], None]]:
+        if not METRICS_ACTIVE:
+            return progress_callback
+
+        def report(stage: str, percent: float):
+            if stage != self.stage:
+                self.stop()
+                self.stage = stage
+                self.started = time.perf_counter()
+            if progress_callback:
+                progress_callback(stage, percent)
+        return report
+
+    def stop(self):
+        if self.stage is not None:
+            STAGE_SECONDS.labels(self.stage).observe(time.perf_counter() - self.started)
+            self.stage = None
+
+def observe_job(status: str, seconds: float, input_bytes: int):
+    if METRICS_ACTIVE:
+        JOBS_TOTAL.labels(status).inc()
+        JOB_SECONDS.labels(status).observe(seconds)
+        INPUT_BYTES_TOTAL.inc(input_bytes)
+
+def observe_transcript(words: int):
+    if METRICS_ACTIVE:
+        WORDS_TOTAL.inc(words)
+
+def observe_segments(segments: int):
+    if METRICS_ACTIVE:
+        SEGMENTS_TOTAL.inc(segments)
+
+def observe_scoring(vocabulary_size: int, pair_count: int):
+    if METRICS_ACTIVE:
+        VOCABULARY_SIZE.observe(vocabulary_size)
+        DOMINANT_PAIRS.observe(pair_count)
+
+def set_job_gauges(queued: int, active: int):
+    if METRICS_ACTIVE:
+        QUEUE_DEPTH.set(queued)
+        ACTIVE_JOBS.set(active)
+
+def mark_process_dead():
+    """Gọi khi process API dừng, để gauge livesum không còn tính process này."""
+    if METRICS_ACTIVE and os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Số liệu gộp của mọi process (API và job worker) ở định dạng text của Prometheus."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,104 @@
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterable, Optional, Tuple
+
+from app.config import get_config
+from app.utils.extract import _worker_model_size, create_transcribe_pool, load_whisper_model
+
+logger = logging.getLogger(__name__)
+
+config = get_config()
+
+def model_size_bytes(model: Any) -> int:
+    """Approximate resident size of a torch model (parameters + buffers)."""
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        return 0
+
+class WhisperModelRegistry:
+    """
+    Whisper models loaded on first use and cached per model name, and (WHISPER_PARALLEL) pools of
+    model replicas, one pool per model.
+
+    Models and pools share one LRU order and memory budget (a pool counts as workers x model size);
+    when loading would exceed memory_budget_bytes, the least recently used entries are dropped first.
+    """
+
+    def __init__(self, memory_budget_bytes: int):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._models: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _used_bytes(self) -> int:
+        return sum(size for _, size in self._models.values())
+
+    def _evict_for(self, needed_bytes: int):
+        while self._models and self._used_bytes() + needed_bytes > self.memory_budget_bytes:
+            name, (entry, size) = self._models.popitem(last=False)
+            if isinstance(entry, ProcessPoolExecutor):
+                # Chunk đã gửi vào pool vẫn chạy xong, sau đó các process thoát
+                entry.shutdown(wait=False)
+            logger.info(f"Unloaded Whisper model '{name}' ({size / 1024 ** 2:.0f} MB) to stay within the memory budget.")
+
+    def get(self, model_name: str) -> Optional[Any]:
+        # Một lock chung: các request cùng model chờ nhau thay vì tải model nhiều lần
+        with self._lock:
+            if model_name in self._models:
+                self._models.move_to_end(model_name)
+                return self._models[model_name][0]
+
+            model = load_whisper_model(model_name)
+            if model is None:
+                return None
+            size = model_size_bytes(model)
+            self._evict_for(size)
+            self._models[model_name] = (model, size)
+            logger.info(f"Whisper model '{model_name}' loaded ({size / 1024 ** 2:.0f} MB, "
+                        f"{len(self._models)} resident).")
+            return model
+
+    def get_pool(self, model_name: str) -> Optional[ProcessPoolExecutor]:
+        """Pool replica của model_name (WHISPER_PARALLEL); tạo lần đầu, các model khác giữ pool riêng."""
+        key = f"pool:{model_name}"
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key][0]
+
+            pool, workers = create_transcribe_pool(model_name)
+            try:
+                # Chờ một replica tải xong để biết kích thước model
+                size = pool.submit(_worker_model_size).result() * workers
+            except Exception as e:
+                logger.error(f"Failed to start Whisper '{model_name}' workers: {e}")
+                pool.shutdown(wait=False, cancel_futures=True)
+                return None
+            self._evict_for(size)
+            self._models[key] = (pool, size)
+            logger.info(f"Whisper '{model_name}' worker pool started ({workers} replicas, {size / 1024 ** 2:.0f} MB, "
+                        f"{len(self._models)} resident).")
+            return pool
+
+    def warm_up(self, model_names: Iterable[str]):
+        for model_name in model_names:
+            logger.info(f"Warming up Whisper model '{model_name}'...")
+            if config.WHISPER_PARALLEL:
+                self.get_pool(model_name)
+            else:
+                self.get(model_name)
+
+    def loaded_models(self) -> list:
+        with self._lock:
+            return list(self._models.keys())
+
+_registry: Optional[WhisperModelRegistry] = None
+
+def get_model_registry() -> WhisperModelRegistry:
+    global _registry
+    if _registry is None:
+        _registry = WhisperModelRegistry(config.WHISPER_MEMORY_BUDGET_MB * 1024 ** 2)
+    return _registry
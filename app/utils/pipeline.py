@@ -5,14 +5,21 @@ from typing import Dict, Any, Optional, List, Tuple
 from app.config import get_config
 from app.utils.extract import (
     create_audio_file, 
+    convert_audio_file,
+    extract_audio_pcm,
     extract_transcript, 
-    load_whisper_model,
+    extract_transcript_whisper_parallel,
 )
-from app.models.base import TimedWord, Segment
+from app.utils.model_registry import get_model_registry
+from app.models.transcript import Transcript, SegmentView
+from app.utils.artifact_cache import ArtifactCache, get_artifact_cache
+from app.utils.ffmpeg_runner import ProgressCallback
+from app.utils.video_processor import probe_media_streams
+from app.utils.metrics import StageTimer, observe_segments, observe_transcript
 
 from app.utils.segmentation import segment_transcript
 from app.utils.calc_score import calc_score_segments
-from app.utils.skim_generator import generate_skim 
+from app.utils.skim_generator import generate_skim, generate_skims, generate_edl
 import time
 import logging
 import os
@@ -24,18 +31,18 @@ logger = logging.getLogger(__name__)
 
 config = get_config()
 
-model_whisper = load_whisper_model(model_name=config.WHISPER_MODEL_NAME)
-def get_model_whisper() -> Optional[Any]:
-    return model_whisper
+def get_model_whisper(model_name: Optional[str] = None) -> Optional[Any]:
+    """Whisper model từ registry (tải ở lần dùng đầu tiên, không tải lúc import)."""
+    return get_model_registry().get(model_name or config.WHISPER_MODEL_NAME)
 
 WHISPER_API_URL = os.getenv("WHISPER_API_URL", "")
 WHISPER_API_URL = WHISPER_API_URL.rstrip("/")  # Đảm bảo không có dấu "/" ở cuối URL
 WHISPER_API_URL = WHISPER_API_URL + "/transcribe"  # Thêm /transcribe vào cuối URL nếu cần
 
-def call_whisper_api(audio_path: Path) -> List[TimedWord]:
-    """Hàm gọi API Whisper và trả về List[TimedWord]."""
+def call_whisper_api(audio_path: Path) -> Transcript:
+    """Hàm gọi API Whisper và trả về Transcript."""
     logger.info(f"Calling Whisper API at: {WHISPER_API_URL} for audio: {audio_path}")
-    transcripts_data = []
+    transcripts_data = Transcript.empty()
     try:
         # Mở file audio ở chế độ đọc nhị phân (rb)
         with open(audio_path, 'rb') as f:
@@ -51,9 +58,8 @@ def call_whisper_api(audio_path: Path) -> List[TimedWord]:
             # Lấy kết quả JSON từ API (đây là list các dictionary)
             results_list_dict = response.json()
 
-            # Chuyển đổi list[dict] thành list[TimedWord]
-            # (Bước này cần thiết nếu các hàm sau như segment_transcript yêu cầu đối tượng TimedWord)
-            transcripts_data = [TimedWord(**item) for item in results_list_dict]
+            # Chuyển đổi list[dict] thành Transcript dạng cột (không tạo TimedWord cho từng từ)
+            transcripts_data = Transcript.from_records(results_list_dict)
             logger.info(f"API call successful. Received {len(transcripts_data)} words.")
 
     except requests.exceptions.RequestException as e:
@@ -63,75 +69,238 @@ def call_whisper_api(audio_path: Path) -> List[TimedWord]:
 
     return transcripts_data
 
-async def summary_video(
+def asr_backend_id(model_name: str) -> List[str]:
+    """Backend/model đang dùng để nhận dạng giọng nói (một phần của khóa cache transcript)."""
+    if config.WHISPER_LOCAL or WHISPER_API_URL == "":
+        if config.USE_AZURE_SPEECH:
+            return ["azure", config.AZURE_SPEECH_REGION]
+        if config.WHISPER_PARALLEL:
+            return ["whisper-chunked", model_name, config.WHISPER_CHUNK_MINUTES]
+        return ["whisper", model_name]
+    return ["whisper-api", WHISPER_API_URL]
+
+def scoring_params() -> Dict[str, Any]:
+    """Các tham số ảnh hưởng tới segment và điểm (một phần của khóa cache điểm)."""
+    return {
+        "segmentation_n": config.SEGMENTATION_N,
+        "segmentation_m": config.SEGMENTATION_M,
+        "scoring_k": config.SCORING_K,
+        "scoring_b": config.SCORING_B,
+        "pair_count": config.DOMINANT_PAIR_COUNT,
+        "pair_boost": config.DOMINANT_PAIR_BOOST,
+        "pair_search": config.DOMINANT_PAIR_SEARCH,
+        "pair_min_df": config.DOMINANT_PAIR_MIN_DF,
+    }
+
+def report_progress(progress_callback: Optional[ProgressCallback], stage: str, percent: float = 0.0):
+    if progress_callback:
+        progress_callback(stage, percent)
+
+def has_video_stream(media_path: Path) -> bool:
+    """Probe file upload; nếu ffprobe lỗi thì coi như có video (luồng xử lý cũ)."""
+    try:
+        return probe_media_streams(media_path)["video"]
+    except Exception as e:
+        logger.warning(f"Could not probe streams of {media_path}, assuming it has video: {e}")
+        return True
+
+def extract_video_transcript(
     video_path: Path,
-    target_duration: int = 600, # 10 phút
-    model_name: str = "tiny",
-):
-    # step 1: extract video
-    try: 
-        video_name = video_path.stem # stem là tên file không có đuôi
-        logger.info(f"Step 1: Extracting audio from video {video_name}...")
-        
+    video_name: str,
+    model_name: str,
+    cache: Optional[ArtifactCache] = None,
+    video_hash: Optional[str] = None,
+    progress_callback: Optional[ProgressCallback] = None,
+    audio_only: bool = False,
+) -> Optional[Transcript]:
+    """Bước 1-3: tách audio (hoặc lấy từ cache) và nhận dạng giọng nói."""
+    audio_key = cache.make_key("audio", video_hash) if cache else None
+    use_local_whisper = config.WHISPER_LOCAL or WHISPER_API_URL == ""
+    output_path = None
+    
+    if use_local_whisper and not config.USE_AZURE_SPEECH:
+        # Whisper local: giải mã thẳng ra PCM 16 kHz trong bộ nhớ, không ghi file audio
+        audio_input = cache.load_array(audio_key, "audio_pcm16k.npy") if cache else None
+        if audio_input is not None:
+            logger.info("Using cached PCM audio.")
+        else:
+            logger.info("Decoding audio track to in-memory PCM for Whisper.")
+            audio_input = extract_audio_pcm(video_path)
+            if audio_input is None:
+                logger.error("Failed to decode audio track.")
+                return None
+            if cache:
+                cache.save_array(audio_key, "audio_pcm16k.npy", audio_input)
+    else:
         if config.USE_AZURE_SPEECH:
             logger.info("Using Azure Speech Service for audio extraction.")
             output_path = config.audio_path / f"{video_name}_audio.wav"
         else:
             logger.info("Using local audio extraction.")
             output_path = config.audio_path / f"{video_name}_audio.mp3"
+        
+        cached_audio = cache.get_path(audio_key, f"audio{output_path.suffix}") if cache else None
+        if cached_audio:
+            logger.info(f"Using cached audio file {cached_audio}.")
+            output_path = cached_audio
+        else:
+            logger.info(f"Output path: {output_path}")
+            # Kiểm tra xem file đã tồn tại chưa
+            if output_path.exists():
+                logger.info(f"Audio file already exists at {output_path}.")
+            if audio_only:
+                # File chỉ có audio: chuyển đổi bằng ffmpeg, không qua moviepy.VideoFileClip
+                response_au = convert_audio_file(video_path, output_path)
+            else:
+                response_au = create_audio_file(video_path, output_path)
+            # response_au = True
+            logger.info(f"Audio file created at {output_path}.")
             
-        logger.info(f"Output path: {output_path}")
-        # Kiểm tra xem file đã tồn tại chưa
-        if output_path.exists():
-            logger.info(f"Audio file already exists at {output_path}.")
-        response_au = create_audio_file(video_path, output_path)
-        # response_au = True
-        logger.info(f"Audio file created at {output_path}.")
+            if not response_au:
+                logger.error("Failed to create audio file.")
+                return None
+            if cache:
+                output_path = cache.put_file(audio_key, f"audio{output_path.suffix}", output_path, move=True)
+        audio_input = output_path
+    
+    report_progress(progress_callback, "transcribing")
+    if use_local_whisper and config.WHISPER_PARALLEL and not config.USE_AZURE_SPEECH:
+        transcripts = extract_transcript_whisper_parallel(audio_input, model_name)
+        if not transcripts:
+            logger.error("Failed to extract transcript.")
+            return None
+    elif use_local_whisper:
+        model = get_model_whisper(model_name)
+        if not model:
+            logger.error("Failed to load Whisper model.")
+            return None
+        transcripts = extract_transcript(audio_input, model)
+        if not transcripts:
+            logger.error("Failed to extract transcript.")
+            return None
+    else:
+        # Nếu không sử dụng Whisper local, gọi API để lấy transcript
+        logger.info("Using Whisper API for transcript extraction.")
+        transcripts = call_whisper_api(output_path)
+        if not transcripts:
+            logger.error("Failed to extract transcript via API.")
+            return None
+    return transcripts
+
+async def summary_video(
+    video_path: Path,
+    target_duration: int = 600, # 10 phút
+    model_name: Optional[str] = None, # None: config.WHISPER_MODEL_NAME
+    target_durations: Optional[List[int]] = None, # Nhiều thời lượng: trả về Dict[duration, Path]
+    render: bool = True, # False: chỉ trả về danh sách đoạn đã chọn (EDL), không render video
+    edl_formats: Optional[List[str]] = None, # Khi render=False: định dạng thêm ngoài json ("cmx", "vtt")
+    progress_callback: Optional[ProgressCallback] = None, # (stage, percent) để cập nhật trạng thái task
+    hls: bool = False, # True: công bố playlist HLS dần trong lúc render (chỉ với một target_duration)
+    audio_only: Optional[bool] = None, # True: tóm tắt chỉ có audio; None: tự chọn khi file không có luồng video
+):
+    # Thời gian từng bước được đo tại các lần chuyển bước của callback tiến độ
+    stage_timer = StageTimer()
+    progress_callback = stage_timer.wrap(progress_callback)
+    # step 1: extract video
+    try: 
+        video_name = video_path.stem # stem là tên file không có đuôi
+        model_name = model_name or config.WHISPER_MODEL_NAME
+        if audio_only is None:
+            audio_only = not has_video_stream(video_path)
+        if audio_only:
+            logger.info(f"Audio-only mode for {video_name}: video decode/encode is skipped.")
         
-        if not response_au:
-            logger.error("Failed to create audio file.")
-            return
+        # Cache theo nội dung video: upload lại cùng video (hoặc đổi target_duration)
+        # sẽ bỏ qua tách audio/ASR/chấm điểm
+        cache = get_artifact_cache()
+        video_hash = cache.hash_file(video_path) if cache else None
+        transcript_key = cache.make_key("transcript", video_hash, asr_backend_id(model_name)) if cache else None
+        scores_key = cache.make_key("scores", transcript_key, scoring_params()) if cache else None
         
-        if config.WHISPER_LOCAL or WHISPER_API_URL == "":
-            model = get_model_whisper()
-            if not model:
-                logger.error("Failed to load Whisper model.")
-                return
-            transcripts = extract_transcript(output_path, model)
-            if not transcripts:
-                logger.error("Failed to extract transcript.")
-                return
+        transcripts = cache.load_transcript(transcript_key) if cache else None
+        scored_segments = None
+        if transcripts is not None:
+            logger.info(f"Using cached transcript for video {video_name} ({len(transcripts)} words).")
+            cached_segments = cache.load_json(scores_key, "segments.json")
+            if cached_segments:
+                logger.info("Using cached segments and scores, skipping to skim generation.")
+                scored_segments = [
+                    SegmentView(id=item["id"], transcript=transcripts, start_idx=item["start_idx"],
+                                end_idx=item["end_idx"], score=item["score"])
+                    for item in cached_segments
+                ]
         else:
-            # Nếu không sử dụng Whisper local, gọi API để lấy transcript
-            logger.info("Using Whisper API for transcript extraction.")
-            transcripts = call_whisper_api(output_path)
+            logger.info(f"Step 1: Extracting audio from video {video_name}...")
+            report_progress(progress_callback, "extracting_audio")
+            transcripts = extract_video_transcript(video_path, video_name, model_name, cache, video_hash,
+                                                   progress_callback, audio_only)
             if not transcripts:
-                logger.error("Failed to extract transcript via API.")
                 return
-            
-        # step 4: segment transcript
-        logger.info("Step 4: Segmenting transcript...")
-        segments = await segment_transcript(transcripts)
-        if not segments:
-            logger.error("Failed to segment transcript.")
-            return
-        logger.info(f"Number of segments: {len(segments)}")
+            observe_transcript(len(transcripts))
+            if cache:
+                cache.save_transcript(transcript_key, transcripts)
         
-        # step 5: calculate score for segments
-        logger.info("Step 5: Calculating scores for segments...")
-        scored_segments = await calc_score_segments(segments)
-        if not scored_segments:
-            logger.error("Failed to calculate scores for segments.")
-            return
+        if scored_segments is None:
+            # step 4: segment transcript
+            logger.info("Step 4: Segmenting transcript...")
+            report_progress(progress_callback, "segmenting")
+            segments = await segment_transcript(transcripts)
+            if not segments:
+                logger.error("Failed to segment transcript.")
+                return
+            logger.info(f"Number of segments: {len(segments)}")
+            observe_segments(len(segments))
+            
+            # step 5: calculate score for segments
+            logger.info("Step 5: Calculating scores for segments...")
+            report_progress(progress_callback, "scoring")
+            scored_segments = await calc_score_segments(segments)
+            if not scored_segments:
+                logger.error("Failed to calculate scores for segments.")
+                return
+            if cache:
+                cache.save_json(scores_key, "segments.json", [
+                    {"id": seg.id, "start_idx": seg.start_idx, "end_idx": seg.end_idx, "score": seg.score}
+                    for seg in scored_segments
+                ])
         
         # step 6: generate skim
-        logger.info("Step 6: Generating skim...")
-        final_summary_path = await generate_skim(
-            segments=scored_segments,
-            target_duration=target_duration,
-            original_video_path=video_path,
-            output_filename_base=video_name,
-        )
+        report_progress(progress_callback, "generating_summary")
+        if not render:
+            logger.info("Step 6: Writing edit decision list (rendering skipped)...")
+            durations = target_durations or [target_duration]
+            final_summary_path = {}
+            for duration in durations:
+                edl_paths = generate_edl(
+                    segments=scored_segments,
+                    target_duration=duration,
+                    original_video_path=video_path,
+                    output_filename_base=video_name if len(durations) == 1 else f"{video_name}_{duration}s",
+                    formats=edl_formats or [],
+                )
+                for fmt, path in edl_paths.items():
+                    final_summary_path[fmt if len(durations) == 1 else f"{duration}.{fmt}"] = path
+        elif target_durations:
+            # Chọn segment riêng cho từng thời lượng, các đoạn chung chỉ cắt/mã hóa một lần
+            final_summary_path = await generate_skims(
+                segments=scored_segments,
+                target_durations=target_durations,
+                original_video_path=video_path,
+                output_filename_base=video_name,
+                progress_callback=progress_callback,
+                hls=hls and not audio_only,
+                audio_only=audio_only,
+            )
+        else:
+            final_summary_path = await generate_skim(
+                segments=scored_segments,
+                target_duration=target_duration,
+                original_video_path=video_path,
+                output_filename_base=video_name,
+                progress_callback=progress_callback,
+                hls=hls and not audio_only,
+                audio_only=audio_only,
+            )
         if not final_summary_path:
             logger.error("Failed to generate skim.")
             return
@@ -156,6 +325,7 @@ async def summary_video(
         logger.info("Removed temporary list file: temp_list.txt")
         
         # step 8: remove video file
+        # (cả khi render=false: EDL tham chiếu timeline của file gốc, file đó do client giữ)
         if video_path.exists():
             os.remove(video_path)
             logger.info(f"Removed original video file: {video_path}")
@@ -167,4 +337,6 @@ async def summary_video(
         return final_summary_path
     except Exception as e:
         logger.error(f"Error processing video: {e}", exc_info=True)
+    finally:
+        stage_timer.stop()
     
\ No newline at end of file
@@ -0,0 +1,103 @@
+import cProfile
+import json
+import logging
+import pstats
+import random
+import shutil
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.config import get_config
+
+logger = logging.getLogger(__name__)
+
+config = get_config()
+
+PROFILE_FILES = {
+    "profile.prof": "application/octet-stream",  # pstats/snakeviz
+    "profile.txt": "text/plain; charset=utf-8",
+    "memory.txt": "text/plain; charset=utf-8",
+    "summary.json": "application/json",
+}
+TOP_FUNCTIONS = 60
+TOP_ALLOCATIONS = 30
+
+def profile_dir(task_id: str) -> Path:
+    return config.PROFILE_DIR / task_id
+
+def should_profile(requested: bool) -> bool:
+    """Profile khi admin yêu cầu (requested), hoặc ngẫu nhiên theo PROFILE_SAMPLE_RATE (0 = không bao giờ)."""
+    return requested or (config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE)
+
+@contextmanager
+def profile_task(task_id: str) -> Iterator[None]:
+    """
+    Chạy khối lệnh dưới cProfile và tracemalloc, ghi kết quả vào PROFILE_DIR/<task_id>/:
+    profile.prof (pstats), profile.txt (top hàm theo thời gian tích lũy), memory.txt (đỉnh bộ nhớ
+    và các dòng cấp phát nhiều nhất), summary.json.
+
+    Chỉ thread gọi hàm được profile; thread của executor và process con (ffmpeg, pool Whisper/moviepy)
+    chỉ xuất hiện qua thời gian chờ của thread này.
+    """
+    directory = profile_dir(task_id)
+    directory.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Profiling task {task_id} into {directory}")
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        wall_seconds = time.perf_counter() - started
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        try:
+            _write_profile(directory, task_id, profiler, snapshot, wall_seconds, peak_bytes)
+        except Exception as e:
+            logger.error(f"Failed to write profile of task {task_id}: {e}", exc_info=True)
+        prune_profiles(keep=task_id)
+
+def prune_profiles(keep: Optional[str] = None):
+    """Chỉ giữ PROFILE_MAX_KEPT profile mới nhất trong PROFILE_DIR (0 = giữ tất cả)."""
+    if config.PROFILE_MAX_KEPT <= 0 or not config.PROFILE_DIR.is_dir():
+        return
+    entries = []
+    for entry in config.PROFILE_DIR.iterdir():
+        try:
+            if entry.is_dir() and entry.name != keep:
+                entries.append((entry.stat().st_mtime, entry))
+        except OSError:
+            continue
+    entries.sort(key=lambda e: e[0], reverse=True)
+    # keep là profile vừa ghi, luôn được giữ và tính vào giới hạn
+    for _, entry in entries[max(config.PROFILE_MAX_KEPT - 1, 0):]:
+        shutil.rmtree(entry, ignore_errors=True)
+        logger.info(f"Removed old profile {entry.name}")
+
+def _write_profile(directory: Path, task_id: str, profiler: cProfile.Profile,
+                   snapshot: tracemalloc.Snapshot, wall_seconds: float, peak_bytes: int):
+    profiler.dump_stats(directory / "profile.prof")
+    with open(directory / "profile.txt", "w", encoding="utf-8") as f:
+        pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+    top_allocations = snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+    with open(directory / "memory.txt", "w", encoding="utf-8") as f:
+        f.write(f"Peak traced memory: {peak_bytes / 1024 ** 2:.1f} MiB\n")
+        f.write(f"Top {len(top_allocations)} allocation sites still alive at the end:\n")
+        for stat in top_allocations:
+            f.write(f"{stat}\n")
+
+    (directory / "summary.json").write_text(json.dumps({
+        "task_id": task_id,
+        "wall_seconds": round(wall_seconds, 3),
+        "peak_memory_bytes": peak_bytes,
+        "files": sorted(PROFILE_FILES),
+    }, indent=2), encoding="utf-8")
+    logger.info(f"Profile of task {task_id}: {wall_seconds:.1f}s, peak {peak_bytes / 1024 ** 2:.1f} MiB")
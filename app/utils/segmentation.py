@@ -1,25 +1,66 @@
 # filepath: d:\Sgroup\Sgroup-AI\video-meet-summarier\app\utils\segmentation.py
-from typing import List, Tuple
+from typing import List, Tuple, Union
 import logging
-from app.models.base import TimedWord, Segment
+import numpy as np
+from app.models.base import TimedWord
+from app.models.transcript import Transcript, SegmentView
 from app.config import get_config
 
 logger = logging.getLogger(__name__)
 
 config_settings = get_config()
 
-def calc_pauses(transcripts: List[TimedWord]) -> List[Tuple[float, int]]:
-    pauses = []
-    if len(transcripts) < 2:
-        return pauses
-    for index, word in enumerate(transcripts):
-        if index > 0:
-            duration = word.start - transcripts[index - 1].end
-            if duration > 0:
-                pauses.append((duration, index - 1))
-    return pauses
+def calc_pauses(transcript: Transcript) -> List[Tuple[float, int]]:
+    """(pause duration, index of the word before the pause) for every positive gap."""
+    if len(transcript) < 2:
+        return []
+    gaps = transcript.starts[1:] - transcript.ends[:-1]
+    indices = np.nonzero(gaps > 0)[0]
+    return list(zip(gaps[indices].tolist(), indices.tolist()))
+
+def sliding_top2(values: List[float], m: int) -> List[Tuple[float, float]]:
+    """
+    For each i, the largest and second largest value in values[max(0, i-m):i+m+1].
+
+    Van Herk/Gil-Werman blocks of width 2m+1: every window is the disjoint union of
+    a block suffix and the next block's prefix, so the whole sweep is O(P).
+    Missing values (window of size 1) are reported as -inf.
+    """
+    neg_inf = float("-inf")
+    width = 2 * m + 1
+    padded = [neg_inf] * m + list(values) + [neg_inf] * m
+    size = len(padded)
+
+    def merge(x, y):
+        # top-2 of the multiset union of two top-2 pairs
+        if x[0] >= y[0]:
+            return (x[0], y[0] if y[0] > x[1] else x[1])
+        return (y[0], x[0] if x[0] > y[1] else y[1])
 
-async def segment_transcript(transcript: List[TimedWord]) -> List[Segment]:
+    prefix = [None] * size
+    suffix = [None] * size
+    for i in range(size):
+        if i % width == 0:
+            prefix[i] = (padded[i], neg_inf)
+        else:
+            prefix[i] = merge(prefix[i - 1], (padded[i], neg_inf))
+    for i in range(size - 1, -1, -1):
+        if i == size - 1 or (i + 1) % width == 0:
+            suffix[i] = (padded[i], neg_inf)
+        else:
+            suffix[i] = merge(suffix[i + 1], (padded[i], neg_inf))
+
+    result = []
+    for start in range(len(values)):
+        if start % width == 0:
+            result.append(suffix[start])
+        else:
+            result.append(merge(suffix[start], prefix[start + width - 1]))
+    return result
+
+async def segment_transcript(transcript: Union[Transcript, List[TimedWord]]) -> List[SegmentView]:
+    if not isinstance(transcript, Transcript):
+        transcript = Transcript.from_timed_words(transcript)
     if not transcript:
         logger.warning("Input transcript list is empty, returning empty segments.")
         return []
@@ -27,47 +68,30 @@ async def segment_transcript(transcript: List[TimedWord]) -> List[Segment]:
     # Log the first 5 timed words
     logger.info("First 5 timed words:")
     
-    for word in transcript[:5]:
-        logger.info(f"{word}")
+    for record in transcript.to_records(0, 5):
+        logger.info(f"{record}")
     
     pauses = calc_pauses(transcript)
     if not pauses:
-        segment_text = " ".join([w.word for w in transcript])
-        start_time = transcript[0].start if transcript else 0.0
-        end_time = transcript[-1].end if transcript else 0.0
-        duration = max(0.0, end_time - start_time)
         logger.info("No pauses found between words, creating a single segment.")
-        return [Segment(id=0, text=segment_text, start_time=start_time, end_time=end_time, duration=duration, words=transcript)]
+        return [SegmentView(id=0, transcript=transcript, start_idx=0, end_idx=len(transcript))]
     
     segment_boundaries = [0]
     n = config_settings.SEGMENTATION_N
     m = config_settings.SEGMENTATION_M
     
-    window_size = 2 * m + 1 
+    window_top2 = sliding_top2([p[0] for p in pauses], m)
     
     for i in range(len(pauses)):
         current_pause_duration, current_pause_idx = pauses[i]
-        
-        sstart_idx = max(0, i - m)
-        send_idx = min(len(pauses), i + m + 1)
-        window = pauses[sstart_idx:send_idx]
-        
-        if not window:
-            logger.debug(f"Window is empty at index {i}, skipping.")
-            continue
-        
-        window_sorted = sorted(window, key=lambda x: x[0], reverse=True)
-        longest_pause = window_sorted[0][0]
-        longest_pause_index = window_sorted[0][1]
+        longest_pause, second_longest_pause = window_top2[i]
         
         # is_checked = (longest_pause_index == i) 
         is_checked = abs(current_pause_duration - longest_pause) < 1e-9
         
         if is_checked:
-            second_longest_pause = 0.0
-            
-            if len(window_sorted) > 1:
-                second_longest_pause = window_sorted[1][0]
+            if second_longest_pause == float("-inf"):
+                second_longest_pause = 0.0
                 
             is_checked_2 = False
             threshold_pause = 1e-9
@@ -89,7 +113,7 @@ async def segment_transcript(transcript: List[TimedWord]) -> List[Segment]:
     
     segment_boundaries = sorted(list(set(segment_boundaries)))
     
-    segments: List[Segment] = []
+    segments: List[SegmentView] = []
     counter = 0
     
     for i in range(len(segment_boundaries) - 1):
@@ -99,34 +123,17 @@ async def segment_transcript(transcript: List[TimedWord]) -> List[Segment]:
         if start_idx >= end_idx:
             continue
         
-        segment_handle = transcript[start_idx:end_idx]
-        if not segment_handle:
-            logger.warning(f"Segment handle is empty for indices {start_idx} to {end_idx}, skipping.")
-            continue
-        
-        segment_text = " ".join([w.word for w in segment_handle])
-        if not segment_text.strip():
+        if not any(token.strip() for token in transcript.tokens[start_idx:end_idx]):
             logger.warning(f"Segment {counter} is empty, skipping.")
             continue
         
-        start_time = segment_handle[0].start if segment_handle else 0.0
-        end_time = segment_handle[-1].end if segment_handle else 0.0
-        
-        duration = max(0.0, end_time - start_time)
-        
-        if duration <= 0:
+        segment = SegmentView(id=counter, transcript=transcript, start_idx=start_idx, end_idx=end_idx)
+        if segment.duration <= 0:
             logger.warning(f"Segment {counter} has non-positive duration, skipping.")
             continue
         
-        segments.append(Segment(
-            id=counter,
-            text=segment_text,
-            start_time=start_time,
-            end_time=end_time,
-            duration=duration,
-            words=segment_handle
-        ))
+        segments.append(segment)
         counter += 1
-        logger.debug(f"Segment {counter} created with duration {duration:.3f}s.")
+        logger.debug(f"Segment {counter} created with duration {segment.duration:.3f}s.")
     
-    return segments
+    return segments
\ No newline at end of file
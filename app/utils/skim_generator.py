@@ -1,13 +1,26 @@
 # filepath: d:\Sgroup\Sgroup-AI\video-meet-summarier\app\utils\skim_generator.py
 import math
-from typing import List, Dict
+import os
+from typing import Callable, List, Dict, Optional, Tuple
 from pathlib import Path
 import logging
 import asyncio # Để gọi hàm async khác
 
-from app.models.base import Segment
+from app.models.transcript import SegmentView
 from app.config import get_config
-from app.utils.video_processor import cut_segment_refactored, concatenate_segments_ffmpeg
+from app.utils.edl import write_edl
+from app.utils.ffmpeg_runner import ProgressCallback, stage_reporter
+from app.utils.hls import render_ranges_hls
+from app.utils.video_processor import (
+    cut_segments_parallel,
+    concatenate_segments_ffmpeg,
+    render_segments_ffmpeg,
+    render_ranges_to_files_ffmpeg,
+    render_audio_ffmpeg,
+    probe_keyframes,
+    snap_ranges_to_keyframes,
+    cut_segment_copy,
+)
      
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -19,13 +32,15 @@ SUMMARY_DIR = config.SUMMARY_DIR
 TEMP_DIR.mkdir(exist_ok=True)
 SUMMARY_DIR.mkdir(exist_ok=True)
 
-async def generate_skim(
-    segments: List[Segment],       # Danh sách segment đã có điểm
+RENDER_STAGE = "generating_summary" # Tên bước render trong tiến độ task
+
+OUTPUT_FILE_SUFFIX = ".mp4" # Hoặc lấy từ video gốc nếu muốn
+
+def select_segments(
+    segments: List[SegmentView],   # Danh sách segment đã có điểm
     target_duration: int,        # Thời lượng mong muốn (giây)
-    original_video_path: Path, # Đường dẫn video gốc
-    output_filename_base: str    # Tên file output (không có đuôi)
-) -> Path:
-    """Chọn lọc segment theo thuật toán Greedy Knapsack và tạo video tóm tắt."""
+) -> List[SegmentView]:
+    """Chọn lọc segment theo thuật toán Greedy Knapsack, trả về theo thứ tự thời gian gốc."""
     if not segments:
         raise ValueError("No segments provided to generate skim.")
     if target_duration <= 0:
@@ -52,7 +67,7 @@ async def generate_skim(
     segment_efficiencies.sort(key=lambda x: x['efficiency'], reverse=True)
 
     # 3. Thuật toán Tham lam (Greedy Knapsack) để chọn segment
-    selected_segments_info: List[Dict] = [] # Lưu trữ {'segment': Segment, 'efficiency': float}
+    selected_segments_info: List[Dict] = [] # Lưu trữ {'segment': SegmentView, 'efficiency': float}
     current_total_duration = 0.0
     remaining_time = float(target_duration)
     # Dùng set để theo dõi chỉ số của các segment đã chọn trong list gốc (segment_efficiencies)
@@ -105,7 +120,7 @@ async def generate_skim(
     if not selected_segments_info:
         raise ValueError("No segments selected for the summary. Check target duration or segment scores/durations.")
 
-    # Lấy danh sách các đối tượng Segment đã chọn
+    # Lấy danh sách các đối tượng SegmentView đã chọn
     final_selected_segments = [info['segment'] for info in selected_segments_info]
 
     # 5. Sắp xếp lại các segment đã chọn theo thời gian gốc để ghép nối đúng thứ tự
@@ -133,61 +148,163 @@ async def generate_skim(
             seen_ids.add(seg.id)
     final_selected_segments = unique_segments
     logger.info(f"After removing duplicates, {len(final_selected_segments)} unique segments remain.")
+    
+    return final_selected_segments
+
+def merge_close_ranges(segments: List[SegmentView], max_gap: float) -> List[Tuple[float, float]]:
+    """
+    Gộp các segment đã chọn (theo thứ tự thời gian) cách nhau ít hơn max_gap giây thành một
+    khoảng (start, end) duy nhất, để mỗi khoảng chỉ là một lần cắt và không có tiếng "bụp" ở mối nối.
+    """
+    ranges: List[Tuple[float, float]] = []
+    for seg in sorted(segments, key=lambda s: s.start_time):
+        if ranges and seg.start_time - ranges[-1][1] < max_gap:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], seg.end_time))
+        else:
+            ranges.append((seg.start_time, seg.end_time))
+    return ranges
+
+async def render_segments_stream_copy(
+    original_video_path: Path,
+    ranges: List[Tuple[float, float]],
+    final_summary_path: Path,
+    output_filename_base: str,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> bool:
+    """
+    Chế độ "fast": dời các điểm cắt về keyframe, cắt bằng -c copy rồi ghép bằng concat demuxer,
+    không mã hóa lại lần nào. Trả về False nếu không thể (ví dụ nguồn không có keyframe video).
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        keyframes = await loop.run_in_executor(None, probe_keyframes, original_video_path)
+    except Exception as e:
+        logger.error(f"Could not probe keyframes of {original_video_path}: {e}")
+        return False
+    if not keyframes:
+        logger.warning(f"No video keyframes found in {original_video_path}.")
+        return False
+
+    snapped = snap_ranges_to_keyframes(ranges, keyframes, config.SKIM_KEYFRAME_TOLERANCE)
+    logger.info(f"Snapped {len(ranges)} ranges to {len(snapped)} keyframe-aligned ranges "
+                f"(tolerance {config.SKIM_KEYFRAME_TOLERANCE}s).")
+
+    part_paths: List[Path] = []
+    try:
+        for i, (start, end) in enumerate(snapped):
+            part_path = TEMP_DIR / f"{output_filename_base}_copy_part_{i}{original_video_path.suffix or '.mp4'}"
+            part_paths.append(part_path)
+            if not await cut_segment_copy(original_video_path, start, end, part_path):
+                return False
+            if on_progress:
+                on_progress((i + 1) / len(snapped) * 90.0)
+        return await concatenate_segments_ffmpeg(part_paths, final_summary_path, stream_copy=True, on_progress=on_progress)
+    finally:
+        for part_path in part_paths:
+            part_path.unlink(missing_ok=True)
 
-    # 6. Cắt các đoạn video tuần tự
-    segment_file_paths: List[Path] = [] # Lưu đường dẫn file tạm của các segment đã cắt
-    results = [] # Lưu kết quả hoặc exception
-    output_file_suffix = ".mp4" # Hoặc lấy từ video gốc nếu muốn
+def select_ranges(segments: List[SegmentView], target_duration: int) -> List[Tuple[float, float]]:
+    """Chọn segment cho target_duration rồi gộp các segment gần nhau thành khoảng (start, end)."""
+    final_selected_segments = select_segments(segments, target_duration)
+    ranges = merge_close_ranges(final_selected_segments, config.SKIM_MERGE_GAP)
+    logger.info(f"Merged {len(final_selected_segments)} selected segments into {len(ranges)} ranges "
+                f"(gap < {config.SKIM_MERGE_GAP}s).")
+    return ranges
+
+async def generate_skim(
+    segments: List[SegmentView],   # Danh sách segment đã có điểm
+    target_duration: int,        # Thời lượng mong muốn (giây)
+    original_video_path: Path, # Đường dẫn video gốc
+    output_filename_base: str,   # Tên file output (không có đuôi)
+    progress_callback: Optional[ProgressCallback] = None, # (stage, percent)
+    hls: bool = False,           # True: render thành fragment HLS, công bố playlist dần trong lúc render
+    audio_only: bool = False,    # True: chỉ cắt/ghép audio (AAC/Opus), không giải mã/mã hóa video
+) -> Path:
+    """Chọn lọc segment theo thuật toán Greedy Knapsack và tạo video tóm tắt."""
+    ranges = select_ranges(segments, target_duration)
+    if audio_only:
+        audio_summary_path = SUMMARY_DIR / f"{output_filename_base}.{config.AUDIO_SUMMARY_FORMAT}"
+        logger.info(f"Rendering {len(ranges)} ranges into audio-only summary {audio_summary_path}...")
+        if not await render_audio_ffmpeg(original_video_path, ranges, audio_summary_path,
+                                         stage_reporter(progress_callback, RENDER_STAGE)):
+            raise RuntimeError("Failed to render audio summary with ffmpeg.")
+        return audio_summary_path
+    final_summary_path = SUMMARY_DIR / f"{output_filename_base}{OUTPUT_FILE_SUFFIX}"
+    if hls:
+        logger.info(f"Rendering {len(ranges)} ranges as progressive HLS...")
+        if not await render_ranges_hls(original_video_path, ranges, output_filename_base, final_summary_path,
+                                       stage_reporter(progress_callback, RENDER_STAGE)):
+            raise RuntimeError("Failed to render HLS summary.")
+        return final_summary_path
+    return await render_ranges(ranges, original_video_path, final_summary_path, output_filename_base,
+                               stage_reporter(progress_callback, RENDER_STAGE))
+
+async def render_ranges(
+    ranges: List[Tuple[float, float]],
+    original_video_path: Path,
+    final_summary_path: Path,
+    output_filename_base: str,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> Path:
+    """Render các khoảng (start, end) thành video tóm tắt bằng renderer cấu hình trong SKIM_RENDERER."""
+    output_file_suffix = OUTPUT_FILE_SUFFIX
     
-    logger.info(f"Starting to cut {len(final_selected_segments)} segments sequentially...")
+    if config.SKIM_RENDERER == "fast":
+        logger.info(f"Rendering {len(ranges)} ranges into {final_summary_path} with keyframe-aligned stream copy...")
+        if await render_segments_stream_copy(original_video_path, ranges, final_summary_path, output_filename_base, on_progress):
+            return final_summary_path
+        logger.warning("Stream-copy rendering failed, falling back to the ffmpeg re-encoding renderer.")
     
-    for i, segment in enumerate(final_selected_segments):
-        # Tạo tên file tạm duy nhất cho mỗi segment
-        segment_temp_path = TEMP_DIR / f"{output_filename_base}_temp_seg_{segment.id}{output_file_suffix}"
-        segment_file_paths.append(segment_temp_path)
-        
-        logger.info(f"--- Cutting segment {segment.id} ---")
-        try:
-            # Gọi hàm cắt trực tiếp, không tạo danh sách các coroutine trước
-            result = await cut_segment_refactored(
-                original_video_path, 
-                segment.start_time, 
-                segment.end_time, 
-                segment_temp_path
-            )
-            
-            results.append(result) # Thêm kết quả (True/False) vào list
-            if result is True:
-                logger.info(f"--- Successfully cut segment {segment.id} ---")
-            else:
-                logger.error(f"--- Failed to cut segment {segment.id} (path: {segment_temp_path}). Function returned False. ---")
-        except Exception as e:
-            logger.error(f"--- Failed to cut segment {segment.id} (path: {segment_temp_path}): {e} ---", exc_info=True)
-            results.append(e) # Thêm exception vào list
+    if config.SKIM_RENDERER in ("ffmpeg", "fast"):
+        # Một tiến trình ffmpeg duy nhất: trim/atrim + concat, mã hóa output đúng một lần
+        logger.info(f"Rendering {len(ranges)} ranges into {final_summary_path} in a single ffmpeg pass...")
+        if not await render_segments_ffmpeg(original_video_path, ranges, final_summary_path, on_progress):
+            raise RuntimeError("Failed to render summary video with ffmpeg.")
+        return final_summary_path
 
-    # Lọc ra các đường dẫn của những segment cắt thành công
+    # 6. Cắt các khoảng đã gộp song song trong pool tiến trình dùng chung
+    segment_file_paths: List[Path] = [] # Lưu đường dẫn file tạm của các đoạn đã cắt
+    for i in range(len(ranges)):
+        # Tạo tên file tạm duy nhất cho mỗi đoạn
+        segment_file_paths.append(TEMP_DIR / f"{output_filename_base}_temp_seg_{i}{output_file_suffix}")
+    
+    logger.info(f"Starting to cut {len(ranges)} ranges...")
+    
+    # Lưu kết quả (True/False) hoặc exception, theo đúng thứ tự các khoảng
+    results = await cut_segments_parallel(
+        original_video_path,
+        [(start, end, path) for (start, end), path in zip(ranges, segment_file_paths)],
+        on_progress=(lambda percent: on_progress(percent * 0.9)) if on_progress else None,
+    )
+
+    # Lọc ra các đường dẫn của những đoạn cắt thành công
     successful_cut_paths = []
     for i, result in enumerate(results):
+        start, end = ranges[i]
         if isinstance(result, Exception):
-            logger.error(f"Failed to cut segment {final_selected_segments[i].id} (path: {segment_file_paths[i]}): {result}")
+            logger.error(f"Failed to cut range {start:.2f}s-{end:.2f}s (path: {segment_file_paths[i]}): {result}")
         elif result is True: # Giả sử cut_segment trả về True khi thành công
             successful_cut_paths.append(segment_file_paths[i])
         else: # cut_segment trả về False
-            logger.error(f"Failed to cut segment {final_selected_segments[i].id} (path: {segment_file_paths[i]}). Function returned False.")
+            logger.error(f"Failed to cut range {start:.2f}s-{end:.2f}s (path: {segment_file_paths[i]}). Function returned False.")
 
     if not successful_cut_paths:
         # Dọn dẹp các file tạm đã tạo (nếu có) trước khi raise lỗi
         for temp_path in segment_file_paths:
              temp_path.unlink(missing_ok=True)
         raise RuntimeError("Failed to cut any valid video segments.")
-    logger.info(f"Successfully cut {len(successful_cut_paths)} segments.")
+    logger.info(f"Successfully cut {len(successful_cut_paths)} ranges.")
 
     # 7. Ghép nối các đoạn đã cắt thành công
-    final_summary_path = SUMMARY_DIR / f"{output_filename_base}{output_file_suffix}"
-    logger.info(f"Concatenating {len(successful_cut_paths)} segments into {final_summary_path}...")
+    logger.info(f"Concatenating {len(successful_cut_paths)} ranges into {final_summary_path}...")
     # Giả định concatenate_segments là async
     # concatenation_success = await concatenate_segments(successful_cut_paths, final_summary_path)
-    concatenation_success = await concatenate_segments_ffmpeg(successful_cut_paths, final_summary_path)
+    concatenation_success = await concatenate_segments_ffmpeg(
+        successful_cut_paths,
+        final_summary_path,
+        on_progress=(lambda percent: on_progress(90.0 + percent * 0.1)) if on_progress else None,
+        duration=sum(end - start for start, end in ranges),
+    )
 
     # 8. Dọn dẹp file segment tạm sau khi ghép nối (bất kể thành công hay không)
     logger.info("Cleaning up temporary segment files...")
@@ -203,4 +320,199 @@ async def generate_skim(
     #     Nếu dùng async delete: delete_tasks.append(aiofiles.os.remove(str(temp_path)))
     # Nếu dùng async delete: await asyncio.gather(*delete_tasks, return_exceptions=True)
     
-    return final_summary_path
\ No newline at end of file
+    return final_summary_path
+
+def plan_shared_ranges(
+    range_lists: List[List[Tuple[float, float]]],
+) -> Tuple[List[Tuple[float, float]], List[List[object]]]:
+    """
+    Tìm các khoảng (start, end) xuất hiện nguyên vẹn trong từ hai output trở lên: chúng chỉ cần
+    mã hóa một lần. Khoảng không dùng chung thì không bị chia nhỏ, để không có thêm mối nối
+    (khe mồi AAC, lệch A/V) bên trong một khoảng đã gộp.
+
+    Returns:
+        (shared, plans): shared là các khoảng dùng chung (theo thời gian); plans[k] là các phần
+        theo thứ tự của output thứ k: int là chỉ số trong shared, list là một dãy khoảng liên tiếp
+        không dùng chung (mã hóa một lượt).
+    """
+    counts: Dict[Tuple[float, float], int] = {}
+    for ranges in range_lists:
+        for r in set(ranges):
+            counts[r] = counts.get(r, 0) + 1
+    shared = sorted(r for r, count in counts.items() if count > 1)
+    shared_index = {r: i for i, r in enumerate(shared)}
+
+    plans: List[List[object]] = []
+    for ranges in range_lists:
+        plan: List[object] = []
+        for r in ranges:
+            if r in shared_index:
+                plan.append(shared_index[r])
+            elif plan and isinstance(plan[-1], list):
+                plan[-1].append(r)
+            else:
+                plan.append([r])
+        plans.append(plan)
+    return shared, plans
+
+async def render_shared_ranges(
+    original_video_path: Path,
+    shared: List[Tuple[float, float]],
+    shared_paths: List[Path],
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> List[bool]:
+    """Mã hóa mỗi khoảng dùng chung thành một file; trả về thành công/thất bại của từng khoảng."""
+    if not shared:
+        return []
+    if config.SKIM_RENDERER == "moviepy":
+        results = await cut_segments_parallel(
+            original_video_path,
+            [(start, end, path) for (start, end), path in zip(shared, shared_paths)],
+            on_progress=on_progress,
+        )
+        for (start, end), result in zip(shared, results):
+            if result is not True:
+                logger.error(f"Failed to cut shared range {start:.2f}s-{end:.2f}s: {result}")
+        return [result is True for result in results]
+    # Một lệnh ffmpeg giải mã nguồn một lần và mã hóa mỗi khoảng dùng chung thành một file
+    ok = await render_ranges_to_files_ffmpeg(original_video_path, shared, shared_paths, on_progress)
+    return [ok] * len(shared)
+
+async def generate_skims(
+    segments: List[SegmentView],   # Danh sách segment đã có điểm (chấm điểm một lần)
+    target_durations: List[int],   # Các thời lượng mong muốn (giây)
+    original_video_path: Path,
+    output_filename_base: str,
+    progress_callback: Optional[ProgressCallback] = None, # (stage, percent)
+    hls: bool = False,             # Chỉ áp dụng khi có một thời lượng
+    audio_only: bool = False,
+) -> Dict[int, Path]:
+    """
+    Tạo nhiều video tóm tắt (mỗi target_duration một video) từ cùng danh sách segment.
+    Khoảng giống hệt nhau giữa các output chỉ được mã hóa một lần; phần còn lại của mỗi output
+    được mã hóa một lượt rồi ghép với các khoảng dùng chung bằng stream copy.
+    """
+    target_durations = list(dict.fromkeys(target_durations))
+    if len(target_durations) == 1:
+        return {target_durations[0]: await generate_skim(segments, target_durations[0], original_video_path,
+                                                         output_filename_base, progress_callback, hls, audio_only)}
+    if audio_only:
+        # Mã hóa audio rẻ: render riêng từng output, không cần dùng chung khoảng
+        results = {}
+        for duration in target_durations:
+            results[duration] = await generate_skim(segments, duration, original_video_path,
+                                                    f"{output_filename_base}_{duration}s", audio_only=True)
+        return results
+    if hls:
+        logger.warning("Progressive HLS output is only produced for single-duration requests.")
+    on_progress = stage_reporter(progress_callback, RENDER_STAGE)
+    
+    output_paths = {
+        duration: SUMMARY_DIR / f"{output_filename_base}_{duration}s{OUTPUT_FILE_SUFFIX}"
+        for duration in target_durations
+    }
+    range_lists = [select_ranges(segments, duration) for duration in target_durations]
+    
+    def output_progress(k: int, start: float, span: float):
+        if not on_progress:
+            return None
+        return lambda percent: on_progress(start + (k + percent / 100.0) / len(target_durations) * span)
+    
+    if config.SKIM_RENDERER == "fast":
+        # Stream copy không mã hóa gì nên không cần dùng chung khoảng: render từng output
+        results = {}
+        for k, (duration, ranges) in enumerate(zip(target_durations, range_lists)):
+            results[duration] = await render_ranges(ranges, original_video_path, output_paths[duration],
+                                                    f"{output_filename_base}_{duration}s", output_progress(k, 0.0, 100.0))
+        return results
+    
+    shared, plans = plan_shared_ranges(range_lists)
+    total_ranges = sum(len(ranges) for ranges in range_lists)
+    logger.info(f"{len(target_durations)} summaries ({total_ranges} ranges) share {len(shared)} identical ranges.")
+    shared_paths = [TEMP_DIR / f"{output_filename_base}_shared_{i}{OUTPUT_FILE_SUFFIX}" for i in range(len(shared))]
+    temp_paths: List[Path] = list(shared_paths)
+    
+    try:
+        shared_span = 40.0 if shared else 0.0
+        shared_ok = await render_shared_ranges(
+            original_video_path, shared, shared_paths,
+            (lambda percent: on_progress(percent * shared_span / 100.0)) if on_progress else None,
+        )
+        
+        summary_paths: Dict[int, Path] = {}
+        for k, (duration, plan) in enumerate(zip(target_durations, plans)):
+            progress = output_progress(k, shared_span, 100.0 - shared_span)
+            output_base = f"{output_filename_base}_{duration}s"
+            if len(plan) == 1 and isinstance(plan[0], list):
+                # Không có khoảng dùng chung: một lượt render như khi chỉ có một thời lượng
+                try:
+                    summary_paths[duration] = await render_ranges(plan[0], original_video_path, output_paths[duration],
+                                                                  output_base, progress)
+                except Exception as e:
+                    logger.error(f"Failed to render the {duration}s summary: {e}")
+                continue
+            
+            failed = [shared[i] for i in plan if isinstance(i, int) and not shared_ok[i]]
+            if failed:
+                # Không ghép output thiếu đoạn: báo lỗi output này thay vì trả về video bị hổng
+                logger.error(f"The {duration}s summary needs {len(failed)} shared ranges that failed to render.")
+                continue
+            
+            parts: List[Path] = []
+            try:
+                for j, piece in enumerate(plan):
+                    if isinstance(piece, int):
+                        parts.append(shared_paths[piece])
+                        continue
+                    run_path = TEMP_DIR / f"{output_base}_run_{j}{OUTPUT_FILE_SUFFIX}"
+                    temp_paths.append(run_path)
+                    await render_ranges(piece, original_video_path, run_path, f"{output_base}_run_{j}")
+                    parts.append(run_path)
+            except Exception as e:
+                logger.error(f"Failed to render the {duration}s summary: {e}")
+                continue
+            
+            logger.info(f"Concatenating {len(parts)} parts into {output_paths[duration]}...")
+            if await concatenate_segments_ffmpeg(parts, output_paths[duration], stream_copy=True):
+                summary_paths[duration] = output_paths[duration]
+            else:
+                logger.error(f"Failed to concatenate the {duration}s summary.")
+            if progress:
+                progress(100.0)
+        
+        if not summary_paths:
+            raise RuntimeError("Failed to generate any summary video.")
+        missing = [d for d in target_durations if d not in summary_paths]
+        if missing:
+            logger.error(f"Summaries for {missing} seconds could not be generated.")
+        if on_progress:
+            on_progress(100.0)
+        return summary_paths
+    finally:
+        for temp_path in temp_paths:
+            temp_path.unlink(missing_ok=True)
+
+def generate_edl(
+    segments: List[SegmentView],   # Danh sách segment đã có điểm
+    target_duration: int,        # Thời lượng mong muốn (giây)
+    original_video_path: Path, # Đường dẫn video gốc
+    output_filename_base: str,   # Tên file output (không có đuôi)
+    formats: List[str],          # Định dạng thêm ngoài json: "cmx", "vtt"
+) -> Dict[str, Path]:
+    """
+    Chỉ chọn segment và ghi danh sách (start, end, score, text), không render video. Các khoảng cắt
+    được gộp như khi render (SKIM_MERGE_GAP), để EDL khớp với video mà render sẽ tạo ra.
+    """
+    final_selected_segments = select_segments(segments, target_duration)
+    ranges = merge_close_ranges(final_selected_segments, config.SKIM_MERGE_GAP)
+    return write_edl(
+        final_selected_segments,
+        SUMMARY_DIR,
+        f"{output_filename_base}_edl",
+        original_video_path.name,
+        target_duration,
+        formats,
+        fps=config.EDL_FRAME_RATE,
+        ranges=ranges,
+    )
+
@@ -0,0 +1,337 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, ContextManager, Dict, List, Optional
+
+from app.config import get_config
+from app.models.base import TaskStatusEnum
+
+logger = logging.getLogger(__name__)
+
+config = get_config()
+
+FINAL_STATUSES = (TaskStatusEnum.COMPLETED, TaskStatusEnum.FAILED)
+UNFINISHED_STATUSES = (TaskStatusEnum.PENDING, TaskStatusEnum.PROCESSING)
+
+# Process API tạo task (task chạy trong job queue của process đó); mỗi lần khởi động có id mới
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+INTERRUPTED_MESSAGE = "Interrupted: the server stopped before the task finished"
+
+# Cột lưu dạng JSON trong SQLite
+JSON_FIELDS = ("result_urls", "result_paths", "stage_timings")
+FIELDS = (
+    "task_id", "status", "message", "current_step", "progress",
+    "result_url", "result_urls", "playlist_url", "result_paths", "error",
+    "stage_timings", "stage_started_at", "created_at", "updated_at",
+    "owner", "heartbeat_at",
+)
+
+def _close_stage(task: Dict[str, Any], now: float):
+    """Cộng thời gian của bước đang chạy vào stage_timings (giây)."""
+    stage, started = task.get("current_step"), task.get("stage_started_at")
+    if stage and started is not None:
+        timings = dict(task.get("stage_timings") or {})
+        timings[stage] = round(timings.get(stage, 0.0) + now - started, 3)
+        task["stage_timings"] = timings
+        task["stage_started_at"] = None
+
+class TaskStore(ABC):
+    """
+    Trạng thái các task tóm tắt: status, bước hiện tại, thời gian từng bước, kết quả và lỗi.
+
+    Backend chỉ cần cài _transaction() (khóa đọc-sửa-ghi), _load(), _save(), _unfinished(), _touch()
+    và list_by_status(); logic chuyển trạng thái nằm ở đây để các backend hành xử giống nhau.
+
+    Mỗi task ghi owner (OWNER_ID của process API chạy nó). Process đó định kỳ làm mới heartbeat_at
+    của các task chưa xong của mình; task chưa xong có heartbeat quá TASK_STALE_SECONDS thuộc về
+    process đã chết (restart, crash) và được chuyển sang FAILED, không đụng tới task của worker khác.
+    """
+
+    _heartbeat_stop: Optional[threading.Event] = None
+
+    @abstractmethod
+    def _transaction(self) -> ContextManager[Any]:
+        """Context manager giữ khóa đọc-sửa-ghi, trả về handle truyền cho _load/_save."""
+
+    @abstractmethod
+    def _load(self, tx: Any, task_id: str) -> Optional[Dict[str, Any]]:
+        """Đọc một task trong transaction, None nếu không có."""
+
+    @abstractmethod
+    def _save(self, tx: Any, task: Dict[str, Any]):
+        """Ghi (thêm hoặc thay) một task trong transaction."""
+
+    @abstractmethod
+    def _unfinished(self, tx: Any) -> List[Dict[str, Any]]:
+        """Các task PENDING/PROCESSING trong transaction."""
+
+    @abstractmethod
+    def _touch(self, tx: Any, owner: str, now: float):
+        """Đặt heartbeat_at = now cho các task chưa xong của owner."""
+
+    @abstractmethod
+    def list_by_status(self, status: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Các task có status, mới nhất trước."""
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._transaction() as tx:
+            return self._load(tx, task_id)
+
+    def create(self, task_id: str, message: str = "", limit: Optional[int] = None) -> bool:
+        """
+        Tạo task PENDING thuộc process này (OWNER_ID). limit: chỉ tạo khi process này có ít hơn limit task
+        chưa xong (đếm trong cùng transaction); trả về False nếu đã đủ. Giới hạn tính theo từng process vì
+        task chạy trong job queue của process tạo ra nó, không chuyển sang process khác.
+        """
+        now = time.time()
+        task = {field: None for field in FIELDS}
+        task.update(task_id=task_id, status=TaskStatusEnum.PENDING, message=message,
+                    stage_timings={}, created_at=now, updated_at=now, owner=OWNER_ID, heartbeat_at=now)
+        with self._transaction() as tx:
+            if limit is not None and sum(t["owner"] == OWNER_ID for t in self._unfinished(tx)) >= limit:
+                return False
+            self._save(tx, task)
+        return True
+
+    def record_stage(self, task_id: str, stage: str, progress: float, message: str,
+                     playlist_url: Optional[str] = None) -> bool:
+        """Cập nhật bước/tiến độ (task chuyển sang PROCESSING). Bỏ qua nếu task đã kết thúc."""
+        now = time.time()
+        with self._transaction() as tx:
+            task = self._load(tx, task_id)
+            if task is None or task["status"] in FINAL_STATUSES:
+                return False
+            if task["current_step"] != stage:
+                _close_stage(task, now)
+                task["current_step"] = stage
+                task["stage_started_at"] = now
+            task.update(status=TaskStatusEnum.PROCESSING, progress=progress, message=message, updated_at=now)
+            if playlist_url and not task["playlist_url"]:
+                task["playlist_url"] = playlist_url
+            self._save(tx, task)
+            return True
+
+    def finish(self, task_id: str, status: str, message: str, **fields):
+        """Kết thúc task (COMPLETED/FAILED) với kết quả hoặc lỗi (result_url, result_urls, result_paths, error...)."""
+        now = time.time()
+        with self._transaction() as tx:
+            task = self._load(tx, task_id)
+            if task is None:
+                return
+            _close_stage(task, now)
+            task.update(fields)
+            task.update(status=status, message=message, updated_at=now)
+            if status == TaskStatusEnum.COMPLETED:
+                task["progress"] = 100.0
+            self._save(tx, task)
+
+    def fail_interrupted(self, stale_after: float, own: bool = False) -> int:
+        """
+        Chuyển sang FAILED các task chưa xong mà process chủ đã dừng: heartbeat cũ hơn stale_after giây
+        (task của process này thì không, trừ khi own=True: dùng khi chính process này dừng). Trả về số task.
+        """
+        now = time.time()
+        failed = 0
+        with self._transaction() as tx:
+            for task in self._unfinished(tx):
+                mine = task["owner"] == OWNER_ID
+                heartbeat = task["heartbeat_at"] or task["updated_at"]
+                if not (own and mine) and (mine or heartbeat >= now - stale_after):
+                    continue
+                _close_stage(task, now)
+                task.update(status=TaskStatusEnum.FAILED, message=INTERRUPTED_MESSAGE,
+                            error=f"{INTERRUPTED_MESSAGE} (owner {task['owner'] or 'unknown'})", updated_at=now)
+                self._save(tx, task)
+                failed += 1
+        if failed:
+            logger.warning(f"Marked {failed} interrupted tasks as failed.")
+        return failed
+
+    def start_heartbeat(self):
+        """
+        Thread nền: làm mới heartbeat các task của process này và đánh FAILED task của process đã chết,
+        mỗi TASK_HEARTBEAT_SECONDS (lần đầu ngay khi khởi động).
+        """
+        if self._heartbeat_stop is not None:
+            return
+        self._heartbeat_stop = threading.Event()
+        threading.Thread(target=self._heartbeat_loop, args=(self._heartbeat_stop,),
+                         name="task-heartbeat", daemon=True).start()
+
+    def stop_heartbeat(self):
+        """Dừng heartbeat; các task chưa xong của process này bị đánh FAILED (job của chúng dừng theo)."""
+        if self._heartbeat_stop is None:
+            return
+        self._heartbeat_stop.set()
+        self._heartbeat_stop = None
+        self.fail_interrupted(config.TASK_STALE_SECONDS, own=True)
+
+    def _heartbeat_loop(self, stop: threading.Event):
+        while True:
+            try:
+                with self._transaction() as tx:
+                    self._touch(tx, OWNER_ID, time.time())
+                self.fail_interrupted(config.TASK_STALE_SECONDS)
+            except Exception as e:
+                logger.error(f"Task store heartbeat failed: {e}")
+            if stop.wait(config.TASK_HEARTBEAT_SECONDS):
+                break
+
+class MemoryTaskStore(TaskStore):
+    """Trong bộ nhớ process: mất khi khởi động lại, không chia sẻ giữa các worker uvicorn."""
+
+    def __init__(self):
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            yield self._tasks
+
+    def _load(self, tx, task_id):
+        task = tx.get(task_id)
+        return dict(task) if task is not None else None
+
+    def _save(self, tx, task):
+        tx[task["task_id"]] = dict(task)
+
+    def _unfinished(self, tx):
+        return [dict(t) for t in tx.values() if t["status"] in UNFINISHED_STATUSES]
+
+    def _touch(self, tx, owner, now):
+        for task in tx.values():
+            if task["owner"] == owner and task["status"] in UNFINISHED_STATUSES:
+                task["heartbeat_at"] = now
+
+    def list_by_status(self, status, limit=100):
+        with self._lock:
+            tasks = [dict(t) for t in self._tasks.values() if t["status"] == status]
+        return sorted(tasks, key=lambda t: t["created_at"], reverse=True)[:limit]
+
+class SqliteTaskStore(TaskStore):
+    """
+    File SQLite ở chế độ WAL: đọc không chặn ghi, nhiều worker uvicorn (--workers N) dùng chung.
+    Mỗi thread có một connection riêng; đọc-sửa-ghi nằm trong BEGIN IMMEDIATE.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    message TEXT,
+                    current_step TEXT,
+                    progress REAL,
+                    result_url TEXT,
+                    result_urls TEXT,
+                    playlist_url TEXT,
+                    result_paths TEXT,
+                    error TEXT,
+                    stage_timings TEXT,
+                    stage_started_at REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    owner TEXT,
+                    heartbeat_at REAL
+                )
+            """)
+            # Database tạo bởi phiên bản trước chưa có owner/heartbeat_at
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+            for column, column_type in (("owner", "TEXT"), ("heartbeat_at", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {column_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, created_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: tự quản lý transaction bằng BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _from_row(row: sqlite3.Row) -> Dict[str, Any]:
+        task = dict(row)
+        for field in JSON_FIELDS:
+            if task[field] is not None:
+                task[field] = json.loads(task[field])
+        return task
+
+    def _load(self, tx, task_id):
+        row = tx.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._from_row(row) if row is not None else None
+
+    def _save(self, tx, task):
+        values = [
+            json.dumps(task.get(field)) if field in JSON_FIELDS and task.get(field) is not None else task.get(field)
+            for field in FIELDS
+        ]
+        tx.execute(
+            f"INSERT OR REPLACE INTO tasks ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})",
+            values,
+        )
+
+    def _unfinished(self, tx):
+        rows = tx.execute(
+            f"SELECT * FROM tasks WHERE status IN ({', '.join('?' * len(UNFINISHED_STATUSES))})",
+            UNFINISHED_STATUSES,
+        ).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def _touch(self, tx, owner, now):
+        tx.execute(
+            f"UPDATE tasks SET heartbeat_at = ? WHERE owner = ? "
+            f"AND status IN ({', '.join('?' * len(UNFINISHED_STATUSES))})",
+            (now, owner, *UNFINISHED_STATUSES),
+        )
+
+    def get(self, task_id):
+        # Đọc đơn lẻ không cần khóa ghi
+        row = self._connection().execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._from_row(row) if row is not None else None
+
+    def list_by_status(self, status, limit=100):
+        rows = self._connection().execute(
+            "SELECT * FROM tasks WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)
+        ).fetchall()
+        return [self._from_row(row) for row in rows]
+
+_task_store: Optional[TaskStore] = None
+
+def get_task_store() -> TaskStore:
+    global _task_store
+    if _task_store is None:
+        if config.TASK_STORE_BACKEND == "sqlite":
+            _task_store = SqliteTaskStore(config.TASK_STORE_PATH)
+        else:
+            _task_store = MemoryTaskStore()
+        logger.info(f"Task store backend: {config.TASK_STORE_BACKEND}")
+    return _task_store
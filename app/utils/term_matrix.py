@@ -0,0 +1,103 @@
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.models.transcript import SegmentView
+
+logger = logging.getLogger(__name__)
+
+def preprocess_text(text: str) -> Optional[str]:
+    text_cleaned = ''.join(filter(str.isalnum, text)).lower()
+    return text_cleaned if text_cleaned else None
+
+class TermMatrix:
+    """
+    Ma trận tần suất segment x từ, lưu dạng CSR trên từ vựng đã đánh số nguyên.
+
+    Hàng i ứng với segment thứ i (theo thứ tự đầu vào); các term id của hàng i là
+    term_ids[indptr[i]:indptr[i + 1]] (tăng dần) với số lần xuất hiện counts tương ứng.
+    Từ vựng được sắp xếp theo chuỗi nên thứ tự term id trùng thứ tự từ điển.
+    """
+
+    def __init__(
+        self,
+        segment_ids: np.ndarray,
+        vocab: List[str],
+        indptr: np.ndarray,
+        term_ids: np.ndarray,
+        counts: np.ndarray,
+    ):
+        self.segment_ids = segment_ids
+        self.vocab = vocab
+        self.vocab_index: Dict[str, int] = {w: idx for idx, w in enumerate(vocab)}
+        self.indptr = indptr
+        self.term_ids = term_ids
+        self.counts = counts
+        # chỉ số hàng của từng phần tử CSR
+        self.rows = np.repeat(np.arange(len(segment_ids)), np.diff(indptr))
+
+    @property
+    def num_segments(self) -> int:
+        return len(self.segment_ids)
+
+    @property
+    def num_terms(self) -> int:
+        return len(self.vocab)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """L_i: số từ (đã lọc) của từng segment."""
+        return np.bincount(self.rows, weights=self.counts, minlength=self.num_segments)
+
+    @property
+    def term_freq(self) -> np.ndarray:
+        """n_w: tổng số lần xuất hiện của từng từ trên toàn bộ video."""
+        return np.bincount(self.term_ids, weights=self.counts, minlength=self.num_terms)
+
+    @property
+    def doc_freq(self) -> np.ndarray:
+        """Số segment chứa từng từ."""
+        return np.bincount(self.term_ids, minlength=self.num_terms)
+
+    def segment_terms(self, row: int) -> np.ndarray:
+        return self.term_ids[self.indptr[row]:self.indptr[row + 1]]
+
+def build_term_matrix(segments: List[SegmentView]) -> TermMatrix:
+    """Đánh số từ vựng và đếm tần suất từ cho toàn bộ transcript trong một lượt."""
+    normalized: Dict[str, Optional[str]] = {}  # từ gốc -> từ đã lọc, mỗi từ gốc chỉ xử lý một lần
+    first_seen: Dict[str, int] = {}            # từ đã lọc -> id tạm theo thứ tự xuất hiện
+    token_rows: List[int] = []
+    token_ids: List[int] = []
+
+    for row, segment in enumerate(segments):
+        for raw in segment.tokens:
+            if raw in normalized:
+                token = normalized[raw]
+            else:
+                token = normalized[raw] = preprocess_text(raw)
+            if token is None:
+                continue
+            token_id = first_seen.get(token)
+            if token_id is None:
+                token_id = first_seen[token] = len(first_seen)
+            token_rows.append(row)
+            token_ids.append(token_id)
+
+    num_segments = len(segments)
+    vocab = sorted(first_seen)
+    # đổi id tạm sang id theo thứ tự từ điển
+    remap = np.empty(len(vocab), dtype=np.int64)
+    for new_id, token in enumerate(vocab):
+        remap[first_seen[token]] = new_id
+
+    rows = np.asarray(token_rows, dtype=np.int64)
+    ids = remap[np.asarray(token_ids, dtype=np.int64)] if token_ids else np.empty(0, dtype=np.int64)
+    keys, counts = np.unique(rows * max(len(vocab), 1) + ids, return_counts=True)
+    entry_rows = keys // max(len(vocab), 1)
+    term_ids = keys % max(len(vocab), 1)
+    indptr = np.searchsorted(entry_rows, np.arange(num_segments + 1))
+
+    segment_ids = np.fromiter((s.id for s in segments), dtype=np.int64, count=num_segments)
+    logger.info(f"Term matrix: {num_segments} segments, {len(vocab)} terms, {len(token_ids)} tokens.")
+    return TermMatrix(segment_ids, vocab, indptr, term_ids, counts.astype(np.float64))
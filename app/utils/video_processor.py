@@ -2,17 +2,27 @@ import logging
 import os
 import traceback
 import moviepy as mp
-import whisper
-from typing import List, Tuple, Dict, Any, Optional
+from typing import Callable, List, Tuple, Dict, Any, Optional
 from pathlib import Path
 import subprocess
+import json
+import numpy as np
 import cv2
 import shlex
 
 # from asyncio import run_in_executor
 import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from moviepy import VideoFileClip
 
+from app.config import get_config
+from app.utils.ffmpeg_runner import run_ffmpeg
+from app.utils.metrics import time_operation
+
+config = get_config()
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -50,6 +60,7 @@ def load_whisper_model(model_name: str = "base") -> Optional[Any]:
     model = None
     try:
         logger.info(f"Loading Whisper model ('{model_name}')... This might take a while.")
+        import whisper
         # model = whisper.load_model(model_name, device="cuda")
         model = whisper.load_model(model_name)
         logger.info(f"Whisper model '{model_name}' loaded successfully.")
@@ -107,60 +118,67 @@ def speech_recognition(audio_path: str, whisper_model: Any) -> List[Tuple[str, f
         logger.error(f"Error during Whisper speech recognition for {audio_path}: {e}", exc_info=True)
         return [] # Trả về list rỗng khi có lỗ
                    
-async def cut_segment_refactored(input_path: Path, start_seconds: float, end_seconds: float, output_path: Path) -> bool:
-    loop = asyncio.get_running_loop()
-
-    def _do_cut():
-        logger.info(f"Đang thử cắt: {input_path} [{start_seconds:.3f}s -> {end_seconds:.3f}s] -> {output_path}")
-        clip_to_write = None # Khởi tạo là None
-        temp_audio_path = None # Đường dẫn file audio tạm
-        try:
-            # *** Sử dụng câu lệnh 'with' để quản lý tài nguyên ***
-            with VideoFileClip(str(input_path)) as original_clip:
-                # Kiểm tra sự tồn tại của audio một cách tin cậy
-                has_audio = original_clip.audio is not None
-                logger.info(f"Đã tải clip gốc. Thời lượng: {original_clip.duration:.3f}s, Phát hiện audio: {has_audio}")
-
-                # Đảm bảo thời gian bắt đầu/kết thúc nằm trong giới hạn (tùy chọn nhưng nên làm)
-                actual_end = min(end_seconds, original_clip.duration)
-                actual_start = min(start_seconds, actual_end)
-
-                # Kiểm tra thời lượng subclip hợp lệ (phải > 0)
-                if actual_end - actual_start <= 0.01: # Ngưỡng nhỏ để tránh lỗi
-                     logger.warning(f"Bỏ qua segment do thời gian không hợp lệ sau khi điều chỉnh: start={actual_start:.3f}, end={actual_end:.3f}")
-                     return False # Không thể tạo clip có thời lượng bằng 0 hoặc âm
-
-                logger.info(f"Đang tạo subclip từ {actual_start:.3f}s đến {actual_end:.3f}s")
-                # Quan trọng: Tạo subclip *trước* khi đóng original_clip bằng 'with'
-                clip_to_write = original_clip.subclipped(actual_start, actual_end)
-
-                # Kiểm tra audio của subclip - đôi khi subclip có thể mất đối tượng audio nếu thời lượng quá nhỏ
-                subclip_has_audio = clip_to_write.audio is not None
-                logger.info(f"Subclip đã tạo. Thời lượng: {clip_to_write.duration:.3f}s, Có audio: {subclip_has_audio}")
-
-                # Chỉ định rõ codec để tương thích tốt hơn
-                # Sử dụng threads=1 ban đầu để ổn định, sau đó tăng nếu cần
-                # Tạo tên file audio tạm duy nhất
-                temp_audio_filename = f"{output_path.stem}_temp_audio_{os.urandom(4).hex()}.m4a"
-                temp_audio_path = output_path.parent / temp_audio_filename
-
-                common_args = {
-                    "codec": "libx264",          # Codec video phổ biến
-                    "audio_codec": "aac",       # Codec audio phổ biến
-                    "temp_audiofile": str(temp_audio_path), # File audio tạm duy nhất
-                    "remove_temp": True,        # Tự động xóa file audio tạm , False để giữ lại
-                    "logger": None,             # Đặt là 'bar' để xem tiến trình, None để log gọn hơn
-                    "threads": 4,               # Số luồng cho ffmpeg (điều chỉnh nếu cần)
-                    "preset": "medium",         # Cân bằng tốc độ mã hóa/nén
-                    "ffmpeg_params": ["-map_metadata", "-1", "-vsync", "cfr"] # Tránh lỗi metadata, đảm bảo fps ổn định
-                }
-
-                if subclip_has_audio:
-                    logger.info(f"Đang ghi segment có audio vào {output_path}...")
+def cut_segment_moviepy(
+    input_path: Path,
+    start_seconds: float,
+    end_seconds: float,
+    output_path: Path,
+    source_clip: Optional[VideoFileClip] = None,
+) -> bool:
+    """Cắt [start, end) bằng moviepy (chặn). source_clip: clip nguồn đã mở sẵn để dùng lại, nếu có."""
+    logger.info(f"Đang thử cắt: {input_path} [{start_seconds:.3f}s -> {end_seconds:.3f}s] -> {output_path}")
+    clip_to_write = None # Khởi tạo là None
+    temp_audio_path = None # Đường dẫn file audio tạm
+    try:
+        # *** Sử dụng câu lệnh 'with' để quản lý tài nguyên ***
+        # Clip nguồn dùng chung của worker (source_clip) không bị đóng ở đây
+        with (VideoFileClip(str(input_path)) if source_clip is None else nullcontext(source_clip)) as original_clip:
+            # Kiểm tra sự tồn tại của audio một cách tin cậy
+            has_audio = original_clip.audio is not None
+            logger.info(f"Đã tải clip gốc. Thời lượng: {original_clip.duration:.3f}s, Phát hiện audio: {has_audio}")
+
+            # Đảm bảo thời gian bắt đầu/kết thúc nằm trong giới hạn (tùy chọn nhưng nên làm)
+            actual_end = min(end_seconds, original_clip.duration)
+            actual_start = min(start_seconds, actual_end)
+
+            # Kiểm tra thời lượng subclip hợp lệ (phải > 0)
+            if actual_end - actual_start <= 0.01: # Ngưỡng nhỏ để tránh lỗi
+                 logger.warning(f"Bỏ qua segment do thời gian không hợp lệ sau khi điều chỉnh: start={actual_start:.3f}, end={actual_end:.3f}")
+                 return False # Không thể tạo clip có thời lượng bằng 0 hoặc âm
+
+            logger.info(f"Đang tạo subclip từ {actual_start:.3f}s đến {actual_end:.3f}s")
+            # Quan trọng: Tạo subclip *trước* khi đóng original_clip bằng 'with'
+            clip_to_write = original_clip.subclipped(actual_start, actual_end)
+
+            # Kiểm tra audio của subclip - đôi khi subclip có thể mất đối tượng audio nếu thời lượng quá nhỏ
+            subclip_has_audio = clip_to_write.audio is not None
+            logger.info(f"Subclip đã tạo. Thời lượng: {clip_to_write.duration:.3f}s, Có audio: {subclip_has_audio}")
+
+            # Chỉ định rõ codec để tương thích tốt hơn
+            # Sử dụng threads=1 ban đầu để ổn định, sau đó tăng nếu cần
+            # Tạo tên file audio tạm duy nhất
+            temp_audio_filename = f"{output_path.stem}_temp_audio_{os.urandom(4).hex()}.m4a"
+            temp_audio_path = output_path.parent / temp_audio_filename
+
+            common_args = {
+                "codec": "libx264",          # Codec video phổ biến
+                "audio_codec": "aac",       # Codec audio phổ biến
+                "temp_audiofile": str(temp_audio_path), # File audio tạm duy nhất
+                "remove_temp": True,        # Tự động xóa file audio tạm , False để giữ lại
+                "logger": None,             # Đặt là 'bar' để xem tiến trình, None để log gọn hơn
+                "threads": 4,               # Số luồng cho ffmpeg (điều chỉnh nếu cần)
+                "preset": "medium",         # Cân bằng tốc độ mã hóa/nén
+                "ffmpeg_params": ["-map_metadata", "-1", "-vsync", "cfr"] # Tránh lỗi metadata, đảm bảo fps ổn định
+            }
+
+            if subclip_has_audio:
+                logger.info(f"Đang ghi segment có audio vào {output_path}...")
+                with time_operation("moviepy-cut"):
                     clip_to_write.write_videofile(str(output_path), **common_args)
-                else:
-                    logger.warning(f"Đang ghi segment KHÔNG CÓ audio vào {output_path}...")
-                    # Ghi không cần các tham số audio
+            else:
+                logger.warning(f"Đang ghi segment KHÔNG CÓ audio vào {output_path}...")
+                # Ghi không cần các tham số audio
+                with time_operation("moviepy-cut"):
                     clip_to_write.write_videofile(
                         str(output_path),
                         codec=common_args["codec"],
@@ -171,52 +189,124 @@ async def cut_segment_refactored(input_path: Path, start_seconds: float, end_sec
                         ffmpeg_params=common_args["ffmpeg_params"]
                      )
 
-            logger.info(f"Đã cắt segment thành công vào {output_path}")
-            return True # Thành công
-
-        except Exception as e:
-            # Ghi lại toàn bộ traceback để debug chi tiết
-            logger.error(f"--- Lỗi khi cắt segment {start_seconds:.3f}s-{end_seconds:.3f}s vào {output_path} ---")
-            logger.error(f"Loại lỗi: {type(e).__name__}")
-            logger.error(f"Chi tiết lỗi: {e}")
-            logger.error(f"Traceback:\n{traceback.format_exc()}") # Ghi lại toàn bộ traceback
-
-            # Dọn dẹp file có thể bị lỗi/chưa hoàn chỉnh
-            if output_path.exists():
-                try:
-                    output_path.unlink()
-                    logger.info(f"Đã xóa file output có thể chưa hoàn chỉnh: {output_path}")
-                except Exception as del_e:
-                    logger.error(f"Không thể xóa file chưa hoàn chỉnh {output_path}: {del_e}")
-            return False # Thất bại
-        finally:
-             # Đảm bảo subclip được đóng nếu nó đã được tạo
-             if clip_to_write is not None and hasattr(clip_to_write, 'close'):
-                 clip_to_write.close()
-                 logger.debug(f"Đã đóng đối tượng subclip cho {output_path}")
-
-             # Xóa file audio tạm nếu còn tồn tại (phòng trường hợp remove_temp=False hoặc lỗi)
-             if temp_audio_path and temp_audio_path.exists():
-                 try:
-                     temp_audio_path.unlink()
-                     logger.debug(f"Đã xóa file audio tạm: {temp_audio_path}")
-                 except Exception as del_audio_e:
-                     logger.warning(f"Không thể xóa file audio tạm {temp_audio_path}: {del_audio_e}")
-
-             logger.debug(f"Hoàn tất xử lý cắt cho {output_path}")
-             # 'original_clip' được đóng tự động bởi câu lệnh 'with'
+        logger.info(f"Đã cắt segment thành công vào {output_path}")
+        return True # Thành công
+
+    except Exception as e:
+        # Ghi lại toàn bộ traceback để debug chi tiết
+        logger.error(f"--- Lỗi khi cắt segment {start_seconds:.3f}s-{end_seconds:.3f}s vào {output_path} ---")
+        logger.error(f"Loại lỗi: {type(e).__name__}")
+        logger.error(f"Chi tiết lỗi: {e}")
+        logger.error(f"Traceback:\n{traceback.format_exc()}") # Ghi lại toàn bộ traceback
+
+        # Dọn dẹp file có thể bị lỗi/chưa hoàn chỉnh
+        if output_path.exists():
+            try:
+                output_path.unlink()
+                logger.info(f"Đã xóa file output có thể chưa hoàn chỉnh: {output_path}")
+            except Exception as del_e:
+                logger.error(f"Không thể xóa file chưa hoàn chỉnh {output_path}: {del_e}")
+        return False # Thất bại
+    finally:
+         # Đảm bảo subclip được đóng nếu nó đã được tạo
+         # (subclip dùng chung reader với clip nguồn, nên giữ nguyên nếu clip nguồn là của worker)
+         if source_clip is None and clip_to_write is not None and hasattr(clip_to_write, 'close'):
+             clip_to_write.close()
+             logger.debug(f"Đã đóng đối tượng subclip cho {output_path}")
+
+         # Xóa file audio tạm nếu còn tồn tại (phòng trường hợp remove_temp=False hoặc lỗi)
+         if temp_audio_path and temp_audio_path.exists():
+             try:
+                 temp_audio_path.unlink()
+                 logger.debug(f"Đã xóa file audio tạm: {temp_audio_path}")
+             except Exception as del_audio_e:
+                 logger.warning(f"Không thể xóa file audio tạm {temp_audio_path}: {del_audio_e}")
+
+         logger.debug(f"Hoàn tất xử lý cắt cho {output_path}")
+         # 'original_clip' được đóng tự động bởi câu lệnh 'with'
 
+async def cut_segment_refactored(input_path: Path, start_seconds: float, end_seconds: float, output_path: Path) -> bool:
+    loop = asyncio.get_running_loop()
     # Chạy hoạt động moviepy chặn (blocking) trong một thread pool executor
-    success = await loop.run_in_executor(None, _do_cut)
+    success = await loop.run_in_executor(None, cut_segment_moviepy, input_path, start_seconds, end_seconds, output_path)
     return success
+
+# Clip nguồn đang mở trong từng worker process, theo (đường dẫn, inode, mtime)
+_worker_source_clip: Optional[VideoFileClip] = None
+_worker_source_key: Optional[Tuple[str, int, int]] = None
+_cut_pool: Optional[ProcessPoolExecutor] = None
+
+def _worker_clip(input_path: str) -> VideoFileClip:
+    """Mở video nguồn một lần, dùng lại cho mọi segment cùng nguồn mà worker cắt; đổi nguồn thì đóng clip cũ."""
+    global _worker_source_clip, _worker_source_key
+    stat = os.stat(input_path)
+    key = (input_path, stat.st_ino, stat.st_mtime_ns)
+    if key != _worker_source_key:
+        if _worker_source_clip is not None:
+            _worker_source_clip.close()
+            _worker_source_clip, _worker_source_key = None, None
+        _worker_source_clip = VideoFileClip(input_path)
+        _worker_source_key = key
+    return _worker_source_clip
+
+def _cut_segment_in_worker(input_path: str, start_seconds: float, end_seconds: float, output_path: Path) -> bool:
+    return cut_segment_moviepy(Path(input_path), start_seconds, end_seconds, output_path, _worker_clip(input_path))
+
+def get_cut_pool() -> ProcessPoolExecutor:
+    """Pool cắt segment bằng moviepy, tạo một lần (SKIM_CUT_WORKERS) và dùng chung cho mọi lần render."""
+    global _cut_pool
+    if _cut_pool is None:
+        workers = config.SKIM_CUT_WORKERS or max(1, (os.cpu_count() or 1) // 4)
+        logger.info(f"Starting {workers} segment cut workers.")
+        _cut_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _cut_pool
+
+async def cut_segments_parallel(
+    input_path: Path,
+    cuts: List[Tuple[float, float, Path]],
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> List[Any]:
+    """
+    Cắt nhiều segment (start, end, output_path) song song trong pool tiến trình dùng chung
+    (moviepy bị giới hạn bởi GIL). Trả về kết quả theo đúng thứ tự cuts: True/False hoặc Exception.
+    on_progress nhận phần trăm số đoạn đã cắt xong.
+    """
+    if not cuts:
+        return []
+    loop = asyncio.get_running_loop()
+    pool = get_cut_pool()
+    logger.info(f"Cutting {len(cuts)} segments in the cut worker pool...")
+    futures = [
+        loop.run_in_executor(pool, _cut_segment_in_worker, str(input_path), start, end, output_path)
+        for start, end, output_path in cuts
+    ]
+    if on_progress:
+        done = [0]
+        def _on_done(_):
+            done[0] += 1
+            on_progress(done[0] / len(futures) * 100.0)
+        for future in futures:
+            future.add_done_callback(_on_done)
+    return await asyncio.gather(*futures, return_exceptions=True)
              
-async def concatenate_segments_ffmpeg(segment_paths: List[Path], output_path: Path) -> bool:
+async def concatenate_segments_ffmpeg(
+    segment_paths: List[Path],
+    output_path: Path,
+    stream_copy: bool = False,
+    on_progress: Optional[Callable[[float], None]] = None,
+    duration: Optional[float] = None,
+) -> bool:
     """
     Ghép nối nhiều phân đoạn video thành một video tổng hợp sử dụng FFmpeg concat demuxer.
 
     Args:
         segment_paths: Danh sách các đường dẫn đến file video phân đoạn.
         output_path: Đường dẫn file đầu ra tổng hợp.
+        stream_copy: True để ghép bằng -c copy (các phân đoạn cùng codec/tham số), không mã hóa lại.
+        on_progress, duration: báo phần trăm hoàn thành theo tổng thời lượng output (nếu biết).
 
     Returns:
         bool: True nếu ghép nối thành công, False nếu thất bại.
@@ -258,7 +348,6 @@ async def concatenate_segments_ffmpeg(segment_paths: List[Path], output_path: Pa
     # 3. Tạo file danh sách tạm thời cho FFmpeg
     # Đặt tên file tạm cụ thể hơn để tránh trùng lặp
     list_file_path = output_path.with_suffix('.ffmpeg_list.txt')
-    loop = asyncio.get_running_loop()
 
     try:
         with open(list_file_path, 'w', encoding='utf-8') as f:
@@ -269,42 +358,31 @@ async def concatenate_segments_ffmpeg(segment_paths: List[Path], output_path: Pa
 
         # 4. Xây dựng câu lệnh FFmpeg
         command = [
-            'ffmpeg',
+            'ffmpeg', '-y',
             '-f', 'concat',        # Sử dụng concat demuxer
             '-safe', '0',          # Cho phép đường dẫn trong file list (cần thiết cho đường dẫn tuyệt đối/tương đối)
             '-i', str(list_file_path), # File danh sách đầu vào
             '-map', '0:v?',        # Map luồng video nếu có (?)
             '-map', '0:a?',        # Map luồng audio nếu có (?)
-            '-c:v', 'libx264',     # Mã hóa lại video bằng libx264
-            '-c:a', 'aac',         # Mã hóa lại audio bằng aac
-            '-preset', 'fast',     # Cân bằng tốc độ/chất lượng (có thể dùng 'medium')
-            '-crf', '23',          # Chất lượng video (thấp hơn = tốt hơn, lớn hơn = file nhỏ hơn)
-            '-vsync', 'cfr',       # Đảm bảo FPS ổn định cho file output (thường tốt cho tương thích)
-            # '-movflags', '+faststart', # Tùy chọn: tối ưu cho xem trực tuyến (ghi moov atom ở đầu)
-            str(output_path)       # File đầu ra
         ]
-
-        # Ghi lại câu lệnh sẽ chạy để dễ debug
-        # Dùng shlex.join cho Python 3.8+ để hiển thị an toàn hơn, hoặc join thủ công
-        try:
-             import shlex
-             log_command = shlex.join(command)
-        except ImportError:
-             log_command = ' '.join(f'"{arg}"' if ' ' in arg else arg for arg in command) # Cách join đơn giản
-        logger.info(f"Running FFmpeg command: {log_command}")
-        
-        # 5. *** Chạy FFmpeg đồng bộ trong executor ***
-        def run_ffmpeg_sync():
-            # capture_output=True để lấy stdout/stderr
-            # text=True để output là string (dễ decode hơn)
-            # check=False để tự xử lý lỗi dựa trên returncode
-            result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', errors='ignore', check=False)
-            return result
-        # Chạy hàm đồng bộ trong executor của event loop hiện tại
-        result = await loop.run_in_executor(None, run_ffmpeg_sync)
-
-        # 6. Kiểm tra kết quả từ subprocess.run
-        if result.returncode != 0:
+        if stream_copy:
+            command += ['-c', 'copy']  # Giữ nguyên các gói dữ liệu, không mã hóa lại
+        else:
+            command += [
+                '-c:v', 'libx264',     # Mã hóa lại video bằng libx264
+                '-c:a', 'aac',         # Mã hóa lại audio bằng aac
+                '-preset', 'fast',     # Cân bằng tốc độ/chất lượng (có thể dùng 'medium')
+                '-crf', '23',          # Chất lượng video (thấp hơn = tốt hơn, lớn hơn = file nhỏ hơn)
+                '-vsync', 'cfr',       # Đảm bảo FPS ổn định cho file output (thường tốt cho tương thích)
+            ]
+        command += faststart_args(output_path) # Ghi moov atom ở đầu để phát khi chưa tải hết file
+        command.append(str(output_path))       # File đầu ra
+
+        # 5. *** Chạy FFmpeg bằng asyncio subprocess (không chiếm thread của executor) ***
+        result = await run_ffmpeg(command, duration=duration, on_progress=on_progress, log_prefix="concat")
+
+        # 6. Kiểm tra kết quả
+        if not result.ok:
             logger.error(f"FFmpeg concatenation failed with exit code {result.returncode}")
             logger.error(f"FFmpeg stderr:\n{result.stderr}")
             output_path.unlink(missing_ok=True)
@@ -332,4 +410,291 @@ async def concatenate_segments_ffmpeg(segment_paths: List[Path], output_path: Pa
              except Exception as e_unlink:
                  # Ghi lại cảnh báo nếu không xóa được file tạm, nhưng không làm hàm thất bại
                  logger.warning(f"Could not delete temporary list file {list_file_path}: {e_unlink}")
-                                
\ No newline at end of file
+                                
+
+def faststart_args(output_path: Path) -> List[str]:
+    """-movflags +faststart cho output MP4/MOV: moov atom ở đầu file, trình duyệt phát được ngay."""
+    if output_path.suffix.lower() in ('.mp4', '.mov', '.m4a', '.m4v'):
+        return ['-movflags', '+faststart']
+    return []
+
+def probe_media_streams(input_path: Path) -> Dict[str, bool]:
+    """Dùng ffprobe kiểm tra file có luồng video / audio hay không."""
+    command = [
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'stream=codec_type,disposition',
+        '-of', 'json',
+        str(input_path),
+    ]
+    result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', errors='ignore', check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed for {input_path}: {result.stderr.strip()}")
+    streams = json.loads(result.stdout or "{}").get("streams", [])
+    # Ảnh bìa (attached_pic) của file audio không tính là video
+    has_video = any(
+        st.get("codec_type") == "video" and not st.get("disposition", {}).get("attached_pic")
+        for st in streams
+    )
+    has_audio = any(st.get("codec_type") == "audio" for st in streams)
+    return {"video": has_video, "audio": has_audio}
+
+def build_trim_concat_filter(ranges: List[Tuple[float, float]], has_video: bool, has_audio: bool) -> str:
+    """Filter graph trim/atrim từng khoảng thời gian rồi concat thành [outv]/[outa]."""
+    parts = []
+    concat_inputs = []
+    for i, (start, end) in enumerate(ranges):
+        if has_video:
+            parts.append(f"[0:v:0]trim=start={start:.3f}:end={end:.3f},setpts=PTS-STARTPTS[v{i}]")
+            concat_inputs.append(f"[v{i}]")
+        if has_audio:
+            parts.append(f"[0:a:0]atrim=start={start:.3f}:end={end:.3f},asetpts=PTS-STARTPTS[a{i}]")
+            concat_inputs.append(f"[a{i}]")
+    outputs = ("[outv]" if has_video else "") + ("[outa]" if has_audio else "")
+    parts.append(
+        f"{''.join(concat_inputs)}concat=n={len(ranges)}:v={int(has_video)}:a={int(has_audio)}{outputs}"
+    )
+    return ";".join(parts)
+
+async def render_segments_ffmpeg(
+    input_path: Path,
+    ranges: List[Tuple[float, float]],
+    output_path: Path,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> bool:
+    """
+    Render các khoảng thời gian (start, end) của video gốc thành một video tóm tắt
+    bằng một lệnh ffmpeg duy nhất (trim/atrim + concat), mã hóa output đúng một lần.
+
+    Returns:
+        bool: True nếu thành công, False nếu thất bại.
+    """
+    if not ranges:
+        logger.error("No ranges provided for rendering.")
+        return False
+
+    loop = asyncio.get_running_loop()
+    try:
+        streams = await loop.run_in_executor(None, probe_media_streams, input_path)
+        if not streams["video"] and not streams["audio"]:
+            logger.error(f"Input {input_path} has neither video nor audio streams.")
+            return False
+        output_path.parent.mkdir(exist_ok=True, parents=True)
+
+        command = [
+            'ffmpeg', '-y', '-nostdin',
+            '-i', str(input_path),
+            '-filter_complex', build_trim_concat_filter(ranges, streams["video"], streams["audio"]),
+        ]
+        if streams["video"]:
+            command += ['-map', '[outv]', '-c:v', 'libx264', '-preset', 'fast', '-crf', '23']
+        if streams["audio"]:
+            command += ['-map', '[outa]', '-c:a', 'aac']
+        command += faststart_args(output_path)
+        command.append(str(output_path))
+
+        result = await run_ffmpeg(
+            command,
+            duration=sum(end - start for start, end in ranges),
+            on_progress=on_progress,
+            log_prefix="render",
+        )
+
+        if not result.ok:
+            logger.error(f"FFmpeg rendering failed with exit code {result.returncode}")
+            logger.error(f"FFmpeg stderr:\n{result.stderr}")
+            output_path.unlink(missing_ok=True)
+            return False
+        if not output_path.exists() or output_path.stat().st_size == 0:
+            logger.error("FFmpeg reported success (exit code 0), but the output file is missing or empty.")
+            output_path.unlink(missing_ok=True)
+            return False
+
+        logger.info(f"FFmpeg rendering successful: {output_path}")
+        return True
+    except Exception as e:
+        logger.error(f"An unexpected error occurred during FFmpeg rendering: {e}", exc_info=True)
+        output_path.unlink(missing_ok=True)
+        return False
+
+AUDIO_CODEC_ARGS = {
+    ".m4a": ['-c:a', 'aac', '-b:a', '128k'],
+    ".opus": ['-c:a', 'libopus', '-b:a', '64k'],
+}
+
+async def render_audio_ffmpeg(
+    input_path: Path,
+    ranges: List[Tuple[float, float]],
+    output_path: Path,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> bool:
+    """
+    Bản tóm tắt chỉ có audio: atrim (cắt chính xác theo mẫu) + concat các khoảng, không giải mã
+    hay mã hóa video. Codec theo đuôi output_path: .m4a (AAC) hoặc .opus (Opus).
+    """
+    if not ranges:
+        logger.error("No ranges provided for rendering.")
+        return False
+    output_path.parent.mkdir(exist_ok=True, parents=True)
+    command = [
+        'ffmpeg', '-y', '-nostdin',
+        '-vn', '-i', str(input_path),
+        '-filter_complex', build_trim_concat_filter(ranges, has_video=False, has_audio=True),
+        '-map', '[outa]',
+        *AUDIO_CODEC_ARGS.get(output_path.suffix.lower(), AUDIO_CODEC_ARGS[".m4a"]),
+        *faststart_args(output_path),
+        str(output_path),
+    ]
+    result = await run_ffmpeg(
+        command,
+        duration=sum(end - start for start, end in ranges),
+        on_progress=on_progress,
+        log_prefix="render-audio",
+    )
+    if not result.ok or not output_path.exists() or output_path.stat().st_size == 0:
+        logger.error(f"FFmpeg audio rendering failed with exit code {result.returncode}")
+        logger.error(f"FFmpeg stderr:\n{result.stderr}")
+        output_path.unlink(missing_ok=True)
+        return False
+    logger.info(f"FFmpeg audio rendering successful: {output_path}")
+    return True
+
+async def render_ranges_to_files_ffmpeg(
+    input_path: Path,
+    ranges: List[Tuple[float, float]],
+    output_paths: List[Path],
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> bool:
+    """
+    Mã hóa mỗi khoảng (start, end) thành một file riêng trong một lệnh ffmpeg (giải mã nguồn một lần).
+    Các file dùng cùng tham số mã hóa nên có thể ghép lại bằng concat demuxer với -c copy.
+    """
+    if not ranges or len(ranges) != len(output_paths):
+        logger.error("Ranges and output paths must be non-empty and of equal length.")
+        return False
+
+    loop = asyncio.get_running_loop()
+    try:
+        streams = await loop.run_in_executor(None, probe_media_streams, input_path)
+        has_video, has_audio = streams["video"], streams["audio"]
+        if not has_video and not has_audio:
+            logger.error(f"Input {input_path} has neither video nor audio streams.")
+            return False
+
+        parts = []
+        for i, (start, end) in enumerate(ranges):
+            if has_video:
+                parts.append(f"[0:v:0]trim=start={start:.3f}:end={end:.3f},setpts=PTS-STARTPTS[v{i}]")
+            if has_audio:
+                parts.append(f"[0:a:0]atrim=start={start:.3f}:end={end:.3f},asetpts=PTS-STARTPTS[a{i}]")
+        command = ['ffmpeg', '-y', '-nostdin', '-i', str(input_path), '-filter_complex', ";".join(parts)]
+        for i, output_path in enumerate(output_paths):
+            output_path.parent.mkdir(exist_ok=True, parents=True)
+            if has_video:
+                command += ['-map', f'[v{i}]', '-c:v', 'libx264', '-preset', 'fast', '-crf', '23']
+            if has_audio:
+                command += ['-map', f'[a{i}]', '-c:a', 'aac']
+            command.append(str(output_path))
+
+        # Mỗi output bắt đầu từ 0 nên out_time không phản ánh tiến độ chung: chỉ báo khi xong
+        result = await run_ffmpeg(command, on_progress=on_progress, log_prefix="render-parts")
+
+        if not result.ok:
+            logger.error(f"FFmpeg rendering failed with exit code {result.returncode}")
+            logger.error(f"FFmpeg stderr:\n{result.stderr}")
+            return False
+        missing = [p for p in output_paths if not p.exists() or p.stat().st_size == 0]
+        if missing:
+            logger.error(f"FFmpeg reported success (exit code 0), but {len(missing)} output files are missing or empty.")
+            return False
+        return True
+    except Exception as e:
+        logger.error(f"An unexpected error occurred during FFmpeg rendering: {e}", exc_info=True)
+        return False
+
+def probe_keyframes(input_path: Path) -> List[float]:
+    """
+    Thời điểm (giây) các keyframe của luồng video đầu tiên, tăng dần.
+    Đọc cờ K của từng packet nên không cần giải mã video.
+    """
+    command = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        str(input_path),
+    ]
+    result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', errors='ignore', check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed for {input_path}: {result.stderr.strip()}")
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.append(float(pts_time))
+    keyframes.sort()
+    return keyframes
+
+def snap_ranges_to_keyframes(
+    ranges: List[Tuple[float, float]],
+    keyframes: List[float],
+    tolerance: float,
+) -> List[Tuple[float, float]]:
+    """
+    Dời start/end của từng khoảng về keyframe gần nhất trong phạm vi tolerance (giây).
+    Nếu không có keyframe đủ gần, start lùi về keyframe trước đó và end tiến tới keyframe
+    sau đó để không cắt mất lời nói. Các khoảng chồng lấn sau khi dời được gộp lại.
+    """
+    if not keyframes:
+        return list(ranges)
+    kf = np.asarray(keyframes, dtype=np.float64)
+
+    def nearest(t: float) -> Optional[float]:
+        idx = int(np.searchsorted(kf, t))
+        candidates = [kf[i] for i in (idx - 1, idx) if 0 <= i < len(kf)]
+        best = min(candidates, key=lambda k: abs(k - t))
+        return float(best) if abs(best - t) <= tolerance else None
+
+    snapped = []
+    for start, end in ranges:
+        new_start = nearest(start)
+        if new_start is None:
+            idx = int(np.searchsorted(kf, start, side='right')) - 1
+            new_start = float(kf[idx]) if idx >= 0 else start
+        new_end = nearest(end)
+        if new_end is None:
+            idx = int(np.searchsorted(kf, end, side='left'))
+            new_end = float(kf[idx]) if idx < len(kf) else end
+        if new_end - new_start > 0.01:
+            snapped.append((new_start, new_end))
+
+    merged: List[Tuple[float, float]] = []
+    for start, end in sorted(snapped):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+async def cut_segment_copy(input_path: Path, start_seconds: float, end_seconds: float, output_path: Path) -> bool:
+    """
+    Cắt [start, end) bằng -c copy (không mã hóa lại). start nên là một keyframe,
+    nếu không ffmpeg sẽ bắt đầu từ keyframe ngay trước đó.
+    """
+    command = [
+        'ffmpeg', '-y', '-nostdin',
+        '-ss', f"{start_seconds:.3f}",
+        '-i', str(input_path),
+        '-t', f"{end_seconds - start_seconds:.3f}",
+        '-map', '0:v:0?', '-map', '0:a:0?',
+        '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero',
+        str(output_path),
+    ]
+    result = await run_ffmpeg(command, log_prefix="cut-copy")
+
+    if not result.ok or not output_path.exists() or output_path.stat().st_size == 0:
+        logger.error(f"FFmpeg stream-copy cut failed ({start_seconds:.3f}s-{end_seconds:.3f}s, exit code {result.returncode})")
+        logger.error(f"FFmpeg stderr:\n{result.stderr}")
+        output_path.unlink(missing_ok=True)
+        return False
+    return True